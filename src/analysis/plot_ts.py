@@ -1,22 +1,30 @@
-from matplotlib.ticker import MultipleLocator
-import matplotlib.pyplot as plt
+from functools import partial
 import numpy as np
 import random
-import pickle
+import os
 
 from utils.pathing import (
     makepath,
     ensure_path,
     ExperimentPaths,
     EXPERIMENT_DIR,
+    ANALYSIS_CACHE_DIR,
     NEO_DATA_DIR,
     TIME_SERIES_DIR,
     PLOT_TS_DIR,
     SURVIVING_FILE,
     DYING_FILE,
-    EXISTING_FILE
+    EXISTING_FILE,
+    SURVIVING_STORE,
+    DYING_STORE,
+    EXISTING_STORE
 )
 from utils.timeline import TimelineConfig, Timeline
+from utils.ts_store import TimeSeriesStore
+from utils.ragged import ragged_stats
+from utils.data_management import load_usage_index, usage_index_path
+from utils.cache import ResultCache
+from analysis.render import PlotSpec, render_all, set_major_x_ticks
 from utils.config import CommandConfigBase
 
 
@@ -33,17 +41,17 @@ class PlotTimeSeriesConfig(CommandConfigBase):
             Directory (either absolute or relative to 'experiment_dir') from
             which to read the time series data.
 
-        surviving_file: (type: str, default: utils.pathing.SURVIVING_FILE)
+        surviving_file: (type: str, default: utils.pathing.SURVIVING_STORE)
             Path (relative to 'input_dir') of the surviving new word time series
-            file.
+            store (or legacy pickle file). See utils.ts_store.TimeSeriesStore.
 
-        dying_file: (type: str, default: utils.pathing.DYING_FILE)
+        dying_file: (type: str, default: utils.pathing.DYING_STORE)
             Path (relative to 'input_dir') of the dying new word time series
-            file.
+            store (or legacy pickle file). See utils.ts_store.TimeSeriesStore.
 
-        existing_file: (type: str, default: utils.pathing.EXISTING_FILE)
+        existing_file: (type: str, default: utils.pathing.EXISTING_STORE)
             Path (relative to 'input_dir') of the existing word time series
-            file.
+            store (or legacy pickle file). See utils.ts_store.TimeSeriesStore.
 
         neo_dir: (type: Path-like, default: utils.pathing.NEO_DATA_DIR)
             Directory (either absolute or relative to 'experiment_dir') from
@@ -80,20 +88,47 @@ class PlotTimeSeriesConfig(CommandConfigBase):
         plot_std: (type: bool, default: True)
             Whether to plot the standard deviations in the mean plots or not.
 
-        quantile: (type: float, default: 0.25)
-            The quantiles at which to bin the data for the quantile plots.
+        quantile: (type: float or list[float], default: 0.25)
+            The quantiles at which to bin the data (by usage count) for the
+            quantile plots. If a float, bins of that width starting from 0.
+            Otherwise, the lower quantile of each bin, in increasing order, the
+            last bin ending at 1.
 
         timeline_config: (type: dict, default: {})
             Timeline configurations to use. Any given parameters override the
             defaults. See utils.timeline.TimelineConfig for details.
 
+        num_workers: (type: int, default: 1)
+            The number of worker processes among which to split the rendering
+            of the plots. If 1, all plots are rendered serially in the main
+            process. The output is identical either way.
+
+        use_cache: (type: bool, default: True)
+            Whether to cache the aggregated time series (pooled and per
+            quantile) on disk, keyed on the content of the input files and on
+            'drop_last', 'quantile' and 'timeline_config'. Reruns that only
+            change cosmetic configs then only re-render the plots.
+
+        cache_dir: (type: Path-like, default: utils.pathing.ANALYSIS_CACHE_DIR)
+            Directory (either absolute or relative to 'experiment_dir') in which
+            to cache results.
+
+        cache_max_mb: (type: float, default: 1024)
+            Maximum total size of the cache (shared by all analysis stages
+            using 'cache_dir'), in MB. Least recently used results are evicted
+            first.
+
+        cache_max_days: (type: float, default: 30)
+            Maximum number of days since a cached result was last used before
+            it is evicted.
+
         :param kwargs: optional configs to overwrite defaults (see above)
         """
         self.experiment_dir = kwargs.pop('experiment_dir', EXPERIMENT_DIR)
         self.input_dir = kwargs.pop('input_dir', TIME_SERIES_DIR)
-        self.surviving_file = kwargs.pop('surviving_file', SURVIVING_FILE)
-        self.dying_file = kwargs.pop('dying_file', DYING_FILE)
-        self.existing_file = kwargs.pop('existing_file', EXISTING_FILE)
+        self.surviving_file = kwargs.pop('surviving_file', SURVIVING_STORE)
+        self.dying_file = kwargs.pop('dying_file', DYING_STORE)
+        self.existing_file = kwargs.pop('existing_file', EXISTING_STORE)
         self.neo_dir = kwargs.pop('neo_dir', NEO_DATA_DIR)
         self.surviving_neo_file = kwargs.pop(
             'surviving_neo_file', SURVIVING_FILE)
@@ -107,14 +142,23 @@ class PlotTimeSeriesConfig(CommandConfigBase):
         self.plot_std = kwargs.pop('plot_std', True)
         self.quantile = kwargs.pop('quantile', 0.25)
         self.timeline_config = kwargs.pop('timeline_config', {})
+        self.num_workers = kwargs.pop('num_workers', 1)
+        self.use_cache = kwargs.pop('use_cache', True)
+        self.cache_dir = kwargs.pop('cache_dir', ANALYSIS_CACHE_DIR)
+        self.cache_max_mb = kwargs.pop('cache_max_mb', 1024)
+        self.cache_max_days = kwargs.pop('cache_max_days', 30)
         super().__init__(**kwargs)
 
+        if self.num_workers < 1:
+            raise ValueError("'num_workers' must be positive")
+
     def make_paths_absolute(self):
         paths = ExperimentPaths(
             experiment_dir=self.experiment_dir,
             time_series_dir=self.input_dir,
             neo_data_dir=self.neo_dir,
-            plot_ts_dir=self.output_dir
+            plot_ts_dir=self.output_dir,
+            analysis_cache_dir=self.cache_dir
         )
         self.experiment_dir = paths.experiment_dir
         self.input_dir = paths.time_series_dir
@@ -127,6 +171,7 @@ class PlotTimeSeriesConfig(CommandConfigBase):
         self.dying_neo_file = makepath(self.neo_dir, self.dying_neo_file)
         self.existing_neo_file = makepath(self.neo_dir, self.existing_neo_file)
         self.output_dir = paths.plot_ts_dir
+        self.cache_dir = paths.analysis_cache_dir
         return self
 
 
@@ -146,62 +191,97 @@ class PlotTimeSeries:
             self.max_time_slice -= 1
         self.slice_size = tl_config.slice_size
         self.style = None
+        self.specs = []
+        self.cache = None
+        if config.use_cache:
+            self.cache = ResultCache(config.cache_dir,
+                                     max_size=config.cache_max_mb * 2 ** 20,
+                                     max_age=config.cache_max_days * 86400)
 
     def run(self) -> None:
+        # The data is loaded and aggregated once, and reused for every style.
+        surv = self._prepare("Surviving", self.config.surviving_file,
+                             self.config.surviving_neo_file)
+        dying = self._prepare("Dying", self.config.dying_file,
+                              self.config.dying_neo_file)
+        existing = self._prepare("Existing", self.config.existing_file,
+                                 self.config.existing_neo_file)
+        # Only plot specs are built here. All figures are rendered at the end.
         styles = ['seaborn-colorblind', 'seaborn-deep', 'dark_background']
         for style in styles:
-            self.style = style   # Can't get this programmatically from context.
-            with plt.style.context(style):
-                surv = self._do_run("Surviving", self.config.surviving_file,
-                                    self.config.surviving_neo_file)
-                dying = self._do_run("Dying", self.config.dying_file,
-                                     self.config.dying_neo_file)
-                existing = self._do_run("Existing", self.config.existing_file,
-                                        self.config.existing_neo_file)
-                self._plot(surv[0], dying[0], existing[0])
-                self._plot_quantiles(surv[1], dying[1], existing[1])
-
-    def _do_run(self, word_type, input_path, neo_path):
-        with open(input_path, 'rb') as file:
-            all_time_series_by_word = pickle.load(file)
-        self._maybe_drop_last(all_time_series_by_word)
-        self._plot_anecdotes(word_type, all_time_series_by_word)
-        qs = self._split_quantiles(word_type, all_time_series_by_word, neo_path)
-        with_word_type = word_type, self._swap_keys(all_time_series_by_word)
-        self._plot(with_word_type)
-        self._plot_quantiles(qs)
-        return with_word_type, qs
-
-    def _maybe_drop_last(self, all_time_series_by_word):
+            self.style = style
+            for word_type, (store, lengths), pooled, qs in [
+                    surv, dying, existing]:
+                self._plot_anecdotes(word_type, store, lengths)
+                self._plot(pooled)
+                self._plot_quantiles(qs)
+            self._plot(surv[2], dying[2], existing[2])
+            self._plot_quantiles(surv[3], dying[3], existing[3])
+        render_all(self.specs, self.config.num_workers)
+        self.specs = []
+
+    def _prepare(self, word_type, input_path, neo_path):
+        store = TimeSeriesStore.load(input_path)
+        lengths = self._maybe_drop_last(store.lengths)
+        compute = partial(self._aggregate, store, lengths, neo_path)
+        if self.cache is None:
+            pooled, qs = compute()
+        else:
+            index_path = usage_index_path(neo_path)
+            neo_input = index_path if os.path.exists(index_path) else neo_path
+            key = self.cache.key(
+                ResultCache.hash_files(input_path, neo_input), 'plot-ts',
+                self.config.drop_last, int(self.max_time_slice),
+                self.config.quantile)
+            pooled, qs = self.cache.get_or_compute(key, compute)
+        return word_type, (store, lengths), (word_type, pooled), (word_type, qs)
+
+    def _aggregate(self, store, lengths, neo_path):
+        all_time_series = {name: self._masked(store, lengths, name)
+                           for name in store.dims}
+        pooled = self._pool(all_time_series)
+        qs = self._split_quantiles(store, all_time_series, neo_path)
+        return pooled, qs
+
+    def _maybe_drop_last(self, lengths):
         if self.config.drop_last:
-            for time_series_for_word in all_time_series_by_word.values():
-                for time_series in time_series_for_word.values():
-                    if len(time_series) > self.max_time_slice:
-                        del time_series[-1]
-
-    def _plot_anecdotes(self, word_type, all_time_series_by_word):
-        anecdotes = {k: all_time_series_by_word[k] for k in random.sample(
-            list(all_time_series_by_word), self.config.num_anecdotes)}
+            return np.where(lengths > self.max_time_slice, lengths - 1, lengths)
+        return lengths
+
+    @staticmethod
+    def _masked(store, lengths, name):
+        # NaN-padded time series of one dimension, with dropped slices masked.
+        values = np.array(store.dim(name), dtype=float)
+        values[np.arange(values.shape[1]) >= lengths[:, None]] = np.nan
+        return values
+
+    def _plot_anecdotes(self, word_type, store, lengths):
+        words = [str(word) for word in store.words]
+        anecdotes = {words[i]: i for i in random.sample(
+            range(len(words)), self.config.num_anecdotes)}
         for ts_type in ['User', 'Subreddit']:
             filename = f"anecdotal-{word_type}-{ts_type.lower()}-"
+            values = store.dim(ts_type.lower())
 
             # All time series plotted in one graph.
-            plt.figure()
-            for word, time_series in anecdotes.items():
-                ts = time_series[ts_type.lower()]
-                plt.plot(np.arange(len(ts)), ts, label=word)
+            spec = PlotSpec(self.style)
+            for word, i in anecdotes.items():
+                ts = values[i, :lengths[i]].tolist()
+                spec.add('plot', np.arange(len(ts)), ts, label=word)
             self._finalize_plot(
+                spec,
                 title=f"{ts_type} Entropy Time Series for Randomly-Selected "
                       f"{word_type} Words",
                 filename=filename + "all.pdf"
             )
 
             # Each time series in its own graph.
-            for word, time_series in anecdotes.items():
-                plt.figure()
-                ts = time_series[ts_type.lower()]
-                plt.plot(np.arange(len(ts)), ts)
+            for word, i in anecdotes.items():
+                spec = PlotSpec(self.style)
+                ts = values[i, :lengths[i]].tolist()
+                spec.add('plot', np.arange(len(ts)), ts)
                 self._finalize_plot(
+                    spec,
                     title=f"{ts_type} Entropy Time Series for '{word}' "
                           f"({word_type})",
                     filename=filename + f"{word}.pdf",
@@ -209,120 +289,111 @@ class PlotTimeSeries:
                 )
 
     @staticmethod
-    def _swap_keys(all_time_series_by_word):
-        swapped = {}
-        for time_series_for_word in all_time_series_by_word.values():
-            for time_series_name, time_series in time_series_for_word.items():
-                swapped.setdefault(time_series_name, []).append(time_series)
-        return swapped
-
-    def _finalize_plot(self, *, title, filename, legend=True, leg_params=None):
-        plt.xticks(np.arange(self.max_time_slice + 1))
+    def _pool(all_time_series):
+        pooled = {}
+        for time_series_name, values in all_time_series.items():
+            stats = ragged_stats(values)
+            pooled[time_series_name] = stats['mean'], stats['std']
+        return pooled
+
+    def _finalize_plot(self, spec, *, title, filename, legend=True,
+                       leg_params=None):
+        spec.add('xticks', np.arange(self.max_time_slice + 1))
         if self.config.major_x_ticks > 0:
-            ax = plt.gca().xaxis
-            ax.set_major_locator(MultipleLocator(self.config.major_x_ticks))
-            ax.set_minor_locator(MultipleLocator(1))
-        plt.xlabel(f"Time Index ({self.slice_size}s since first appearance)")
-        plt.ylabel("Normalized Entropy")
-        plt.title(title)
+            spec.add(set_major_x_ticks, self.config.major_x_ticks)
+        spec.add('xlabel',
+                 f"Time Index ({self.slice_size}s since first appearance)")
+        spec.add('ylabel', "Normalized Entropy")
+        spec.add('title', title)
         if legend:
             leg_params = leg_params or {}
-            plt.legend(**leg_params)
-        plt.tight_layout()
+            spec.add('legend', **leg_params)
+        spec.add('tight_layout')
         sub_dir = ensure_path(makepath(self.config.output_dir, self.style))
-        plt.savefig(makepath(sub_dir, filename))
-        plt.close()
+        spec.filename = makepath(sub_dir, filename)
+        self.specs.append(spec)
 
     def _plot(self, *args):
         for ts_type in ['User', 'Subreddit']:
-            plt.figure()
-            for word_type, swapped_ts in args:
-                # Variable length input, so can't vectorize easily.
-                ts_list = swapped_ts[ts_type.lower()]
-                index, means, stds = 0, [], []
-                while True:
-                    pool = []
-                    for ts in ts_list:
-                        if index < len(ts):
-                            pool.append(ts[index])
-                    if not pool:
-                        break
-                    means.append(np.mean(pool))
-                    stds.append(np.std(pool))
-                    index += 1
-                means = np.array(means)
-                stds = np.array(stds)
+            spec = PlotSpec(self.style)
+            for word_type, pooled_ts in args:
+                means, stds = pooled_ts[ts_type.lower()]
 
                 # Plot means, stds, and linear regression line.
                 x = np.arange(len(means))
-                color = plt.plot(x, means, label=word_type)[0].get_color()
+                color = PlotSpec.color_of(
+                    spec.add('plot', x, means, label=word_type))
                 if self.config.plot_std:
-                    plt.fill_between(x, means - stds, means + stds,
-                                     color=color, alpha=0.2)
+                    spec.add('fill_between', x, means - stds, means + stds,
+                             color=color, alpha=0.2)
                 else:
                     y = [max(means + stds), min(means - stds)]
-                    plt.scatter([1, 2], y, color='k', alpha=0)
+                    spec.add('scatter', [1, 2], y, color='k', alpha=0)
                 poly1d_fn = np.poly1d(np.polyfit(x, means, 1))
-                plt.plot(x, poly1d_fn(x), color=color, linestyle='dashed')
+                spec.add('plot', x, poly1d_fn(x), color=color,
+                         linestyle='dashed')
             filename = f"{'-'.join(wt for wt, _ in args)}-{ts_type.lower()}.pdf"
             y0 = self.config.legend_y_anchor.get(ts_type.lower(), 0.0)
             self._finalize_plot(
+                spec,
                 title=f"{ts_type}",
                 filename=filename,
                 legend=len(args) > 1,
                 leg_params={'loc': 'center right', 'bbox_to_anchor': (1.0, y0)}
             )
 
-    def _split_quantiles(self, word_type, all_time_series_by_word, neo_path):
-        with open(neo_path, 'rb') as file:
-            usage_dict = pickle.load(file)
-        counts_by_word = {w: len(usage[2]) for w, usage in usage_dict.items()}
-        count_sorted = sorted(counts_by_word.items(), key=lambda item: item[1])
-        words, counts = zip(*count_sorted)
-        quantiles = np.arange(0, 1, self.config.quantile)
-        bins = np.quantile(counts, quantiles)
-        inds = np.digitize(counts, bins) - 1
+    def _quantiles(self):
+        quantile = self.config.quantile
+        if isinstance(quantile, (list, tuple)):
+            lows = np.array(quantile, dtype=float)
+            return lows, np.append(lows[1:], 1.0)
+        lows = np.arange(0, 1, quantile)
+        return lows, lows + quantile
+
+    def _split_quantiles(self, store, all_time_series, neo_path):
+        index = load_usage_index(neo_path)
+        lows, highs = self._quantiles()
+        bins = np.quantile(index['count'], lows)
+
+        # Bin label of each word, aligned with the time series word order.
+        order = np.argsort(index['words'])
+        sorted_words = index['words'][order]
+        sorted_counts = index['count'][order]
+        words = np.asarray(store.words, dtype=str)
+        pos = np.searchsorted(sorted_words, words)
+        found = pos < len(sorted_words)
+        found[found] = sorted_words[pos[found]] == words[found]
+        labels = np.full(len(words), -1)
+        labels[found] = np.digitize(sorted_counts[pos[found]], bins) - 1
+
         splits = []
-        for b, q in enumerate(quantiles + self.config.quantile):
-            word_bin = [w for w, i in zip(words, inds) if i == b]
-            ts_subset = {k: v for k, v in all_time_series_by_word.items()
-                         if k in word_bin}
-            splits.append((q, self._swap_keys(ts_subset)))
-        return word_type, splits
+        for b, q in enumerate(highs):
+            rows = np.flatnonzero(labels == b)
+            splits.append((q, self._pool({name: values[rows] for name, values
+                                          in all_time_series.items()})))
+        return splits
 
     def _plot_quantiles(self, *args):
         for ts_type in ['User', 'Subreddit']:
-            plt.figure()
+            spec = PlotSpec(self.style)
             for word_type, splits in args:
-                for q, swapped_ts in splits:
-                    # Variable length input, so can't vectorize easily.
-                    ts_list = swapped_ts[ts_type.lower()]
-                    index, means, stds = 0, [], []
-                    while True:
-                        pool = []
-                        for ts in ts_list:
-                            if index < len(ts):
-                                pool.append(ts[index])
-                        if not pool:
-                            break
-                        means.append(np.mean(pool))
-                        stds.append(np.std(pool))
-                        index += 1
-                    means = np.array(means)
-                    stds = np.array(stds)
+                for q, pooled_ts in splits:
+                    means, stds = pooled_ts[ts_type.lower()]
 
                     # Plot means, stds, and linear regression line.
                     x = np.arange(len(means))
                     label = f"{word_type} ({q})"
-                    color = plt.plot(x, means, label=label)[0].get_color()
+                    color = PlotSpec.color_of(
+                        spec.add('plot', x, means, label=label))
                     if self.config.plot_std:
-                        plt.fill_between(x, means - stds, means + stds,
-                                         color=color, alpha=0.2)
+                        spec.add('fill_between', x, means - stds, means + stds,
+                                 color=color, alpha=0.2)
                     else:
                         y = [max(means + stds), min(means - stds)]
-                        plt.scatter([1, 2], y, color='k', alpha=0)
+                        spec.add('scatter', [1, 2], y, color='k', alpha=0)
                     poly1d_fn = np.poly1d(np.polyfit(x, means, 1))
-                    plt.plot(x, poly1d_fn(x), color=color, linestyle='dashed')
+                    spec.add('plot', x, poly1d_fn(x), color=color,
+                             linestyle='dashed')
             filename = f"quant-{'-'.join(wt for wt, _ in args)}-{ts_type}.pdf"
-            self._finalize_plot(title=f"{ts_type}", filename=filename,
+            self._finalize_plot(spec, title=f"{ts_type}", filename=filename,
                                 leg_params={'loc': 'lower right'})
@@ -0,0 +1,94 @@
+from matplotlib.ticker import MultipleLocator
+from multiprocessing import Pool
+import matplotlib
+import matplotlib.pyplot as plt
+
+
+class PlotSpec:
+    def __init__(self, style):
+        """
+        Lightweight, picklable description of one figure: the data to plot and
+        the matplotlib.pyplot calls to make with it. Specs are cheap to build
+        in the main process, and are drawn and saved later by render_all(),
+        possibly in worker processes.
+
+        Use pattern:
+
+        spec = PlotSpec('seaborn-deep')
+        line = spec.add('plot', x, y, label='Surviving')
+        spec.add('fill_between', x, y - err, y + err,
+                 color=PlotSpec.color_of(line), alpha=0.2)
+        spec.add('title', 'My Figure')
+        spec.filename = 'my_figure.pdf'
+        render_all([spec], num_workers=4)
+
+        :param style: the matplotlib style in which to draw the figure
+        """
+        self.style = style
+        self.calls = []
+        self.filename = None
+
+    def add(self, func, *args, **kwargs):
+        """
+        Records a call to 'func', either the name of a matplotlib.pyplot
+        function or a picklable (e.g., module-level) function.
+
+        :return: a reference to the result of the call, for color_of()
+        """
+        self.calls.append((func, args, kwargs))
+        return len(self.calls) - 1
+
+    @staticmethod
+    def color_of(ref):
+        """
+        Placeholder for the color of the line plotted by the call 'ref', which
+        is only known once the figure is drawn in its style.
+        """
+        return _ColorOf(ref)
+
+
+class _ColorOf:
+    def __init__(self, ref):
+        self.ref = ref
+
+    def resolve(self, results):
+        return results[self.ref][0].get_color()
+
+
+def set_major_x_ticks(major_x_ticks):
+    ax = plt.gca().xaxis
+    ax.set_major_locator(MultipleLocator(major_x_ticks))
+    ax.set_minor_locator(MultipleLocator(1))
+
+
+def render(spec):
+    """
+    Draws and saves the figure described by 'spec'.
+    """
+    with plt.style.context(spec.style):
+        plt.figure()
+        results = []
+        for func, args, kwargs in spec.calls:
+            if isinstance(func, str):
+                func = getattr(plt, func)
+            kwargs = {k: v.resolve(results) if isinstance(v, _ColorOf) else v
+                      for k, v in kwargs.items()}
+            results.append(func(*args, **kwargs))
+        plt.savefig(spec.filename)
+        plt.close()
+
+
+def render_all(specs, num_workers=1):
+    """
+    Draws and saves all figures. Specs don't depend on each other, so they
+    are split among 'num_workers' processes, each pinned to the non-GUI Agg
+    backend. If 'num_workers' is 1, they are drawn serially in this process.
+    The output files are identical either way.
+    """
+    if num_workers == 1:
+        for spec in specs:
+            render(spec)
+        return
+    with Pool(num_workers, initializer=matplotlib.use,
+              initargs=('Agg',)) as pool:
+        pool.map(render, specs)
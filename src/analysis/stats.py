@@ -1,25 +1,27 @@
-from scipy.stats import spearmanr, ttest_ind_from_stats
-from matplotlib.ticker import MultipleLocator
-import matplotlib.pyplot as plt
+from scipy.stats import ttest_ind_from_stats
+from functools import partial
 import pandas as pd
 import numpy as np
 import itertools
 import logging
-import pickle
-import math
 
 from utils.pathing import (
     makepath,
     ensure_path,
     ExperimentPaths,
     EXPERIMENT_DIR,
+    ANALYSIS_CACHE_DIR,
     TIME_SERIES_DIR,
     STATS_DIR,
-    SURVIVING_FILE,
-    DYING_FILE,
-    EXISTING_FILE
+    SURVIVING_STORE,
+    DYING_STORE,
+    EXISTING_STORE
 )
 from utils.timeline import TimelineConfig, Timeline
+from utils.ts_store import TimeSeriesStore
+from utils.ragged import ragged_stats, expanding_spearman
+from utils.cache import ResultCache
+from analysis.render import PlotSpec, render_all, set_major_x_ticks
 from utils.config import CommandConfigBase
 
 
@@ -36,17 +38,17 @@ class PlotStatsConfig(CommandConfigBase):
             Directory (either absolute or relative to 'experiment_dir') from
             which to read the time series data.
 
-        surviving_file: (type: str, default: utils.pathing.SURVIVING_FILE)
+        surviving_file: (type: str, default: utils.pathing.SURVIVING_STORE)
             Path (relative to 'input_dir') of the surviving new word time series
-            file.
+            store (or legacy pickle file). See utils.ts_store.TimeSeriesStore.
 
-        dying_file: (type: str, default: utils.pathing.DYING_FILE)
+        dying_file: (type: str, default: utils.pathing.DYING_STORE)
             Path (relative to 'input_dir') of the dying new word time series
-            file.
+            store (or legacy pickle file). See utils.ts_store.TimeSeriesStore.
 
-        existing_file: (type: str, default: utils.pathing.EXISTING_FILE)
+        existing_file: (type: str, default: utils.pathing.EXISTING_STORE)
             Path (relative to 'input_dir') of the existing word time series
-            file.
+            store (or legacy pickle file). See utils.ts_store.TimeSeriesStore.
 
         output_dir: (type: Path-like, default: utils.pathing.STATS_DIR)
             Directory (either absolute or relative to 'experiment_dir') in which
@@ -63,24 +65,57 @@ class PlotStatsConfig(CommandConfigBase):
             Timeline configurations to use. Any given parameters override the
             defaults. See utils.timeline.TimelineConfig for details.
 
+        num_workers: (type: int, default: 1)
+            The number of worker processes among which to split the rendering
+            of the plots. If 1, all plots are rendered serially in the main
+            process. The output is identical either way.
+
+        use_cache: (type: bool, default: True)
+            Whether to cache the Spearman's rho statistics on disk, keyed on
+            the content of the input stores and on 'drop_last' and
+            'timeline_config'. Reruns that only change cosmetic configs then
+            only re-render the plots.
+
+        cache_dir: (type: Path-like, default: utils.pathing.ANALYSIS_CACHE_DIR)
+            Directory (either absolute or relative to 'experiment_dir') in which
+            to cache results.
+
+        cache_max_mb: (type: float, default: 1024)
+            Maximum total size of the cache (shared by all analysis stages
+            using 'cache_dir'), in MB. Least recently used results are evicted
+            first.
+
+        cache_max_days: (type: float, default: 30)
+            Maximum number of days since a cached result was last used before
+            it is evicted.
+
         :param kwargs: optional configs to overwrite defaults (see above)
         """
         self.experiment_dir = kwargs.pop('experiment_dir', EXPERIMENT_DIR)
         self.input_dir = kwargs.pop('input_dir', TIME_SERIES_DIR)
-        self.surviving_file = kwargs.pop('surviving_file', SURVIVING_FILE)
-        self.dying_file = kwargs.pop('dying_file', DYING_FILE)
-        self.existing_file = kwargs.pop('existing_file', EXISTING_FILE)
+        self.surviving_file = kwargs.pop('surviving_file', SURVIVING_STORE)
+        self.dying_file = kwargs.pop('dying_file', DYING_STORE)
+        self.existing_file = kwargs.pop('existing_file', EXISTING_STORE)
         self.output_dir = kwargs.pop('output_dir', STATS_DIR)
         self.drop_last = kwargs.pop('drop_last', True)
         self.major_x_ticks = kwargs.pop('major_x_ticks', 0)
         self.timeline_config = kwargs.pop('timeline_config', {})
+        self.num_workers = kwargs.pop('num_workers', 1)
+        self.use_cache = kwargs.pop('use_cache', True)
+        self.cache_dir = kwargs.pop('cache_dir', ANALYSIS_CACHE_DIR)
+        self.cache_max_mb = kwargs.pop('cache_max_mb', 1024)
+        self.cache_max_days = kwargs.pop('cache_max_days', 30)
         super().__init__(**kwargs)
 
+        if self.num_workers < 1:
+            raise ValueError("'num_workers' must be positive")
+
     def make_paths_absolute(self):
         paths = ExperimentPaths(
             experiment_dir=self.experiment_dir,
             time_series_dir=self.input_dir,
-            stats_dir=self.output_dir
+            stats_dir=self.output_dir,
+            analysis_cache_dir=self.cache_dir
         )
         self.experiment_dir = paths.experiment_dir
         self.input_dir = paths.time_series_dir
@@ -88,6 +123,7 @@ class PlotStatsConfig(CommandConfigBase):
         self.dying_file = makepath(self.input_dir, self.dying_file)
         self.existing_file = makepath(self.input_dir, self.existing_file)
         self.output_dir = paths.stats_dir
+        self.cache_dir = paths.analysis_cache_dir
         return self
 
 
@@ -108,6 +144,12 @@ class PlotStats:
         self.slice_size = tl_config.slice_size
         self.style = None
         self.all_time_series_names = None
+        self.specs = []
+        self.cache = None
+        if config.use_cache:
+            self.cache = ResultCache(config.cache_dir,
+                                     max_size=config.cache_max_mb * 2 ** 20,
+                                     max_age=config.cache_max_days * 86400)
 
     def run(self) -> None:
         logging.getLogger().setLevel(logging.INFO)
@@ -118,120 +160,109 @@ class PlotStats:
         self._table(*args)
         styles = ['seaborn-colorblind', 'seaborn-deep', 'dark_background']
         for style in styles:
-            self.style = style  # Can't get this programmatically from context.
-            with plt.style.context(style):
-                for word_type in args:
-                    self._plot(word_type)
-                self._plot(*args)
+            self.style = style
+            for word_type in args:
+                self._plot(word_type)
+            self._plot(*args)
+        render_all(self.specs, self.config.num_workers)
+        self.specs = []
 
     def _do_run(self, word_type, input_path):
-        with open(input_path, 'rb') as file:
-            all_time_series_by_word = pickle.load(file)
-        self._maybe_drop_last(all_time_series_by_word)
-        rhos = self._spearman(all_time_series_by_word)
-        with_word_type = word_type, self._stats(rhos)
+        compute = partial(self._compute, input_path)
+        if self.cache is None:
+            names, stats = compute()
+        else:
+            key = self.cache.key(
+                ResultCache.hash_files(input_path), 'plot-stats',
+                self.config.drop_last, int(self.max_time_slice))
+            names, stats = self.cache.get_or_compute(key, compute)
+        if self.all_time_series_names is None:
+            self.all_time_series_names = names
+        with_word_type = word_type, stats
         return with_word_type
 
-    def _maybe_drop_last(self, all_time_series_by_word):
+    def _compute(self, input_path):
+        store = TimeSeriesStore.load(input_path)
+        lengths = self._maybe_drop_last(store.lengths)
+        rhos = self._spearman(store, lengths)
+        return [ts.title() for ts in store.dims], self._stats(rhos)
+
+    def _maybe_drop_last(self, lengths):
         if self.config.drop_last:
-            for time_series_for_word in all_time_series_by_word.values():
-                for time_series in time_series_for_word.values():
-                    if len(time_series) > self.max_time_slice:
-                        del time_series[-1]
+            return np.where(lengths > self.max_time_slice, lengths - 1, lengths)
+        return lengths
 
-    def _spearman(self, all_time_series_by_word):
-        rhos, swapped = {}, self._swap_keys(all_time_series_by_word)
-        if self.all_time_series_names is None:
-            self.all_time_series_names = list([ts.title() for ts in swapped])
-        for time_series_name, time_series_list in swapped.items():
-            rhos[time_series_name] = []
-            for time_series in time_series_list:
-                rhos_for_k = []
-                for k in range(1, len(time_series)):
-                    rho = spearmanr(np.arange(k + 1), time_series[:k + 1])[0]
-                    if math.isnan(rho):
-                        logging.warning("Treating NaN rho as 0.0")
-                        rho = 0.0
-                    rhos_for_k.append(rho)
-                rhos[time_series_name].append(rhos_for_k)
+    @staticmethod
+    def _spearman(store, lengths):
+        rhos, n_nans = {}, 0
+        for time_series_name in store.dims:
+            all_rhos, n_nan = expanding_spearman(
+                store.dim(time_series_name), lengths)
+            n_nans += n_nan
+            rhos[time_series_name] = all_rhos
+        if n_nans:
+            logging.warning(f"Treating {n_nans} NaN rhos as 0.0")
         return rhos
 
     @staticmethod
     def _stats(rhos):
-        # Variable length input, so can't vectorize easily.
         stats = {}
-        for ts_name, time_series_list in rhos.items():
-            index, means, stds, nobs = 0, [], [], []
-            while True:
-                pool = []
-                for time_series in time_series_list:
-                    if index < len(time_series):
-                        pool.append(time_series[index])
-                if not pool:
-                    break
-                means.append(np.mean(pool))
-                stds.append(np.std(pool))
-                nobs.append(len(pool))
-                index += 1
-            stats[ts_name] = [np.array(means), np.array(stds), np.array(nobs)]
+        for ts_name, all_rhos in rhos.items():
+            pooled = ragged_stats(all_rhos)
+            stats[ts_name] = [pooled['mean'], pooled['std'], pooled['count']]
         return stats
 
-    @staticmethod
-    def _swap_keys(all_time_series_by_word):
-        swapped = {}
-        for time_series_for_word in all_time_series_by_word.values():
-            for time_series_name, time_series in time_series_for_word.items():
-                swapped.setdefault(time_series_name, []).append(time_series)
-        return swapped
-
-    def _finalize_plot(self, *, ylabel, title, filename, legend=True):
-        plt.xticks(np.arange(1, self.max_time_slice + 1))
+    def _finalize_plot(self, spec, *, ylabel, title, filename, legend=True):
+        spec.add('xticks', np.arange(1, self.max_time_slice + 1))
         if self.config.major_x_ticks > 0:
-            ax = plt.gca().xaxis
-            ax.set_major_locator(MultipleLocator(self.config.major_x_ticks))
-            ax.set_minor_locator(MultipleLocator(1))
-        plt.yticks(np.arange(-1, 1.001, 0.5))
-        plt.ylim(-1, 1)
-        plt.xlabel(f"Time Index ({self.slice_size}s since first appearance)")
-        plt.ylabel(ylabel)
-        plt.title(title)
+            spec.add(set_major_x_ticks, self.config.major_x_ticks)
+        spec.add('yticks', np.arange(-1, 1.001, 0.5))
+        spec.add('ylim', -1, 1)
+        spec.add('xlabel',
+                 f"Time Index ({self.slice_size}s since first appearance)")
+        spec.add('ylabel', ylabel)
+        spec.add('title', title)
         if legend:
-            plt.legend()
+            spec.add('legend')
         sub_dir = ensure_path(makepath(self.config.output_dir, self.style))
-        plt.savefig(makepath(sub_dir, filename))
-        plt.close()
+        spec.filename = makepath(sub_dir, filename)
+        self.specs.append(spec)
 
     def _plot(self, *args):
         for ts_type in self.all_time_series_names:
             filename = f"{'-'.join(wt for wt, _ in args)}-{ts_type.lower()}.pdf"
-            plt.figure()
+            spec = PlotSpec(self.style)
             for word_type, stat_ts in args:
                 means, stds, _ = stat_ts[ts_type.lower()]
                 x = np.arange(1, len(means) + 1)
-                color = plt.plot(x, means, label=word_type)[0].get_color()
-                plt.fill_between(x, means - stds, means + stds,
-                                 color=color, alpha=0.2)
+                color = PlotSpec.color_of(
+                    spec.add('plot', x, means, label=word_type))
+                spec.add('fill_between', x, means - stds, means + stds,
+                         color=color, alpha=0.2)
                 poly1d_fn = np.poly1d(np.polyfit(x, means, 1))
-                plt.plot(x, poly1d_fn(x), color=color, linestyle='dashed')
-            self._finalize_plot(ylabel="Spearman's Rho", title=f"{ts_type}",
-                                filename=filename, legend=len(args) > 1)
+                spec.add('plot', x, poly1d_fn(x), color=color,
+                         linestyle='dashed')
+            self._finalize_plot(spec, ylabel="Spearman's Rho",
+                                title=f"{ts_type}", filename=filename,
+                                legend=len(args) > 1)
 
     def _table(self, *args):
-        n_combs = len(list(itertools.combinations(range(len(args)), 2)))
-        n_tests = (len(args) + n_combs) * len(self.all_time_series_names)
+        labels = dict(zip((wt for wt, _ in args),
+                          shortest_unique_prefixes([wt for wt, _ in args])))
+        pairs = list(itertools.combinations(args, 2))
+        n_tests = (len(args) + len(pairs)) * len(self.all_time_series_names)
         n_tests *= self.max_time_slice
-        data, all_index = [], []
-        args_dict = {k[0]: v for k, v in args}
+        tests, all_index = [], []
         for ts_type in self.all_time_series_names:
-            index = []
+            name = ts_type.lower()
             for word_type, stats_ts in args:
-                index.append(word_type[0])
-                self._ttest(stats_ts[ts_type.lower()], n_tests, data)
-            for a, b in list(itertools.combinations(index, 2)):
-                index.append(f"{a} - {b}")
-                self._ttest(args_dict[a][ts_type.lower()], n_tests, data,
-                            second_stats_ts=args_dict[b][ts_type.lower()])
-            all_index.extend([(ts_type, i) for i in index])
+                tests.append((stats_ts[name], None))
+                all_index.append((ts_type, labels[word_type]))
+            for (type_a, stats_a), (type_b, stats_b) in pairs:
+                tests.append((stats_a[name], stats_b[name]))
+                all_index.append(
+                    (ts_type, f"{labels[type_a]} - {labels[type_b]}"))
+        data = significance_table(tests, self.max_time_slice, n_tests)
         filename = f"{'-'.join(wt for wt, _ in args)}.txt"
         cols = [(f"Time Index ({self.slice_size}s since first appearance)",
                 str(i)) for i in range(1, self.max_time_slice + 1)]
@@ -239,26 +270,6 @@ class PlotStats:
         cols = pd.MultiIndex.from_tuples(cols)
         self._save(pd.DataFrame(data, index=all_index, columns=cols), filename)
 
-    def _ttest(self, stats_ts, n_tests, data, second_stats_ts=None):
-        row_data = []
-        if second_stats_ts is None:
-            reps = len(stats_ts[0])
-            second_stats_ts = [[0.0] * reps, [0.0] * reps, [2] * reps]
-        for m1, s1, n1, m2, s2, n2 in zip(*stats_ts, *second_stats_ts):
-            t = ttest_ind_from_stats(m1, s1, n1, m2, s2, n2, equal_var=False)
-            pval = t[1] * n_tests  # Bonferroni Correction.
-            if pval < 0.001:
-                star = "^{***}"
-            elif pval < 0.01:
-                star = "^{**}"
-            elif pval < 0.05:
-                star = "^{*}"
-            else:
-                star = ""
-            row_data.append(f"{m1 - m2:.2f}{star}")
-        row_data.extend(["-"] * (self.max_time_slice - len(row_data)))
-        data.append(row_data)
-
     def _save(self, df, filename):
         df.style.applymap_index(
             lambda v: "rotatebox:{90}--rwrap;", level=0
@@ -277,3 +288,54 @@ class PlotStats:
             multirow_align="c",
             multicol_align="c"
         )
+
+
+def shortest_unique_prefixes(names):
+    """
+    Abbreviates each name to its shortest prefix that no other name starts
+    with (or to the whole name, if another name starts with it).
+    """
+    labels = []
+    for i, name in enumerate(names):
+        others = names[:i] + names[i + 1:]
+        n = 1
+        while n < len(name) and any(o.startswith(name[:n]) for o in others):
+            n += 1
+        labels.append(name[:n])
+    return labels
+
+
+def significance_table(tests, width, n_tests):
+    """
+    Computes all Welch's t-tests of a table at once, and formats each cell as
+    the difference of means, starred by its Bonferroni-corrected p-value.
+
+    :param tests: for each row, the (means, stds, nobs) of its first group and
+        those of its second group, or None to test the first against 0.0
+    :param width: the number of cells in each row. Cells past the end of
+        either group are "-"
+    :param n_tests: the number of tests for the Bonferroni correction
+    :return: the rows of formatted cells
+    """
+    shape = (len(tests), width)
+    m1, s1, n1, m2, s2, n2 = (np.full(shape, np.nan) for _ in range(6))
+    lengths = np.zeros(len(tests), dtype=int)
+    for row, (first, second) in enumerate(tests):
+        length = min(len(first[0]), width)
+        if second is None:
+            second = np.zeros(length), np.zeros(length), np.full(length, 2)
+        length = lengths[row] = min(length, len(second[0]))
+        for array, values in zip([m1, s1, n1], first):
+            array[row, :length] = values[:length]
+        for array, values in zip([m2, s2, n2], second):
+            array[row, :length] = values[:length]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pvals = ttest_ind_from_stats(m1, s1, n1, m2, s2, n2,
+                                     equal_var=False)[1]
+    pvals = pvals * n_tests  # Bonferroni Correction.
+    stars = np.select([pvals < 0.001, pvals < 0.01, pvals < 0.05],
+                      ["^{***}", "^{**}", "^{*}"], default="")
+    diffs = m1 - m2
+    return [[f"{diffs[row, i]:.2f}{stars[row, i]}" if i < length else "-"
+             for i in range(width)]
+            for row, length in enumerate(lengths)]
@@ -6,6 +6,35 @@ from .finder import WordUsageFinderCommand
 from .detector import BasicDetectorCommand
 from .distributions import DistributionsCommand
 from .time_series import TimeSeriesCommand
+from .rollup import RollUpCommand
+from .update import IncrementalUpdateCommand
 from .plot_ts import PlotTimeSeriesCommand
 from .stats import PlotStatsCommand
 from .predictor import PredictionCommand
+from .serve_predict import ServePredictionCommand
+
+
+# All subcommands, in the order listed by 'main.py -h'.
+ALL_COMMANDS = [
+    # Data gathering and cleaning commands.
+    ExistingWordSamplerCommand,
+    RedditDownloaderCommand,
+    RedditPreprocessorCommand,
+
+    # Word usage finding and new word detection commands.
+    RedditCounterCommand,
+    WordUsageFinderCommand,
+    BasicDetectorCommand,
+
+    # Modeling commands.
+    DistributionsCommand,
+    TimeSeriesCommand,
+    RollUpCommand,
+    IncrementalUpdateCommand,
+
+    # Analysis commands.
+    PlotTimeSeriesCommand,
+    PlotStatsCommand,
+    PredictionCommand,
+    ServePredictionCommand
+]
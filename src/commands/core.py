@@ -6,6 +6,13 @@ from utils.config import CommandConfigBase
 
 
 class CommandBase:
+    # The subcommand's name and help text. These are declared statically, and
+    # commands only import their implementation (and its heavy dependencies)
+    # in 'config_class' and 'start()', so that building the parser for all
+    # commands stays fast.
+    name: str = None
+    help: str = None
+
     def __init__(self, subparser):
         """
         Base command from which all other commands derive. Serves as a main
@@ -42,7 +49,8 @@ class CommandBase:
     @property
     def config_class(self) -> Type[CommandConfigBase]:
         """
-        The command's configuration class.
+        The command's configuration class. Only accessed once this command is
+        selected, so it should import the class here, not at module level.
         """
         raise NotImplementedError
 
@@ -58,6 +66,7 @@ class CommandBase:
     def start(self, config: CommandConfigBase, parser_args):
         """
         Start running this command from the given configs and parser args.
+        Like 'config_class', this should import the implementation here.
 
         :param config: an instance of this command's configuration class
         :param parser_args: all parser args for this command
@@ -1,11 +1,15 @@
 from commands.core import CommandBase
-from data.count import RedditCounter, RedditCounterConfig
 
 
 class RedditCounterCommand(CommandBase):
+    name = 'count'
+    help = "count words by user and by subreddit"
+
     @property
     def config_class(self):
+        from data.count import RedditCounterConfig
         return RedditCounterConfig
 
-    def start(self, config: RedditCounterConfig, parser_args):
+    def start(self, config, parser_args):
+        from data.count import RedditCounter
         RedditCounter(config).run()
@@ -1,11 +1,15 @@
 from commands.core import CommandBase
-from data.detect import BasicDetector, BasicDetectorConfig
 
 
 class BasicDetectorCommand(CommandBase):
+    name = 'basic-detect'
+    help = "detect new words from simple time slice cutoffs"
+
     @property
     def config_class(self):
+        from data.detect import BasicDetectorConfig
         return BasicDetectorConfig
 
-    def start(self, config: BasicDetectorConfig, parser_args):
+    def start(self, config, parser_args):
+        from data.detect import BasicDetector
         BasicDetector(config).run()
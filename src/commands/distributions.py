@@ -1,11 +1,16 @@
 from commands.core import CommandBase
-from model.distributions import Distributions, DistributionsConfig
 
 
 class DistributionsCommand(CommandBase):
+    name = 'dists'
+    help = ("compute word frequency distributions for all new "
+            "words")
+
     @property
     def config_class(self):
+        from model.distributions import DistributionsConfig
         return DistributionsConfig
 
-    def start(self, config: DistributionsConfig, parser_args):
+    def start(self, config, parser_args):
+        from model.distributions import Distributions
         Distributions(config).run()
@@ -1,11 +1,15 @@
 from commands.core import CommandBase
-from data.download import RedditDownloader, RedditDownloaderConfig
 
 
 class RedditDownloaderCommand(CommandBase):
+    name = 'download'
+    help = "download a portion of Reddit"
+
     @property
     def config_class(self):
+        from data.download import RedditDownloaderConfig
         return RedditDownloaderConfig
 
-    def start(self, config: RedditDownloaderConfig, parser_args):
+    def start(self, config, parser_args):
+        from data.download import RedditDownloader
         RedditDownloader(config).run()
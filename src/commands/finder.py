@@ -1,11 +1,15 @@
 from commands.core import CommandBase
-from data.find import WordUsageFinder, WordUsageFinderConfig
 
 
 class WordUsageFinderCommand(CommandBase):
+    name = 'find'
+    help = "find all usages of each word in the Reddit data"
+
     @property
     def config_class(self):
+        from data.find import WordUsageFinderConfig
         return WordUsageFinderConfig
 
-    def start(self, config: WordUsageFinderConfig, parser_args):
+    def start(self, config, parser_args):
+        from data.find import WordUsageFinder
         WordUsageFinder(config).run()
@@ -1,14 +1,18 @@
 import random
 
 from commands.core import CommandBase
-from analysis.plot_ts import PlotTimeSeries, PlotTimeSeriesConfig
 
 
 class PlotTimeSeriesCommand(CommandBase):
+    name = 'plot-ts'
+    help = "plot the multiple resulting time series"
+
     @property
     def config_class(self):
+        from analysis.plot_ts import PlotTimeSeriesConfig
         return PlotTimeSeriesConfig
 
-    def start(self, config: PlotTimeSeriesConfig, parser_args):
+    def start(self, config, parser_args):
+        from analysis.plot_ts import PlotTimeSeries
         random.seed(parser_args.seed)
         PlotTimeSeries(config).run()
@@ -1,11 +1,15 @@
 from commands.core import CommandBase
-from predict.predict import Prediction, PredictionConfig
 
 
 class PredictionCommand(CommandBase):
+    name = 'predict'
+    help = "predict word type from the resulting time series"
+
     @property
     def config_class(self):
+        from predict.predict import PredictionConfig
         return PredictionConfig
 
-    def start(self, config: PredictionConfig, parser_args):
+    def start(self, config, parser_args):
+        from predict.predict import Prediction
         Prediction(parser_args.seed, config).run()
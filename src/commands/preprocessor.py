@@ -1,11 +1,15 @@
 from commands.core import CommandBase
-from data.preprocess import RedditPreprocessor, RedditPreprocessorConfig
 
 
 class RedditPreprocessorCommand(CommandBase):
+    name = 'preprocess'
+    help = "preprocess the downloaded Reddit data"
+
     @property
     def config_class(self):
+        from data.preprocess import RedditPreprocessorConfig
         return RedditPreprocessorConfig
 
-    def start(self, config: RedditPreprocessorConfig, parser_args):
+    def start(self, config, parser_args):
+        from data.preprocess import RedditPreprocessor
         RedditPreprocessor(config).run()
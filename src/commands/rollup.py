@@ -0,0 +1,16 @@
+from commands.core import CommandBase
+
+
+class RollUpCommand(CommandBase):
+    name = 'rollup'
+    help = ("compute multi-resolution entropy time series from "
+            "daily base counts")
+
+    @property
+    def config_class(self):
+        from model.rollup import RollUpConfig
+        return RollUpConfig
+
+    def start(self, config, parser_args):
+        from model.rollup import RollUp
+        RollUp(config).run()
@@ -1,14 +1,18 @@
 import random
 
 from commands.core import CommandBase
-from data.sample_existing import ExistingWordSampler, ExistingWordSamplerConfig
 
 
 class ExistingWordSamplerCommand(CommandBase):
+    name = 'sample-existing'
+    help = "randomly samples a number of existing words"
+
     @property
     def config_class(self):
+        from data.sample_existing import ExistingWordSamplerConfig
         return ExistingWordSamplerConfig
 
-    def start(self, config: ExistingWordSamplerConfig, parser_args):
+    def start(self, config, parser_args):
+        from data.sample_existing import ExistingWordSampler
         random.seed(parser_args.seed)
         ExistingWordSampler(config).run()
@@ -0,0 +1,16 @@
+from commands.core import CommandBase
+
+
+class ServePredictionCommand(CommandBase):
+    name = 'serve-predict'
+    help = ("score the word type of new words read from "
+            "stdin with the saved predictors")
+
+    @property
+    def config_class(self):
+        from predict.serve import ServePredictionConfig
+        return ServePredictionConfig
+
+    def start(self, config, parser_args):
+        from predict.serve import ServePrediction
+        ServePrediction(config).run()
@@ -1,11 +1,15 @@
 from commands.core import CommandBase
-from analysis.stats import PlotStats, PlotStatsConfig
 
 
 class PlotStatsCommand(CommandBase):
+    name = 'plot-stats'
+    help = "compute and plot stats from the time series"
+
     @property
     def config_class(self):
+        from analysis.stats import PlotStatsConfig
         return PlotStatsConfig
 
-    def start(self, config: PlotStatsConfig, parser_args):
+    def start(self, config, parser_args):
+        from analysis.stats import PlotStats
         PlotStats(config).run()
@@ -1,11 +1,15 @@
 from commands.core import CommandBase
-from model.time_series import TimeSeries, TimeSeriesConfig
 
 
 class TimeSeriesCommand(CommandBase):
+    name = 'time-series'
+    help = "compute entropy time series from distributions"
+
     @property
     def config_class(self):
+        from model.time_series import TimeSeriesConfig
         return TimeSeriesConfig
 
-    def start(self, config: TimeSeriesConfig, parser_args):
+    def start(self, config, parser_args):
+        from model.time_series import TimeSeries
         TimeSeries(config).run()
@@ -0,0 +1,16 @@
+from commands.core import CommandBase
+
+
+class IncrementalUpdateCommand(CommandBase):
+    name = 'update'
+    help = ("incrementally update counts, usages, distributions "
+            "and time series with newly-arrived data")
+
+    @property
+    def config_class(self):
+        from model.update import IncrementalUpdateConfig
+        return IncrementalUpdateConfig
+
+    def start(self, config, parser_args):
+        from model.update import IncrementalUpdate
+        IncrementalUpdate(config).run()
@@ -72,16 +72,29 @@ class RedditCounter:
         for root, _, files in os.walk(self.config.input_dir):
             for file in files:
                 subreddit_id = dm.parts(file)['subreddit_id']
-                self.subreddits.setdefault(subreddit_id, 0)
                 df = pd.read_csv(makepath(root, file))
-                for a, b in zip(df['author_fullname'], df['body']):
-                    if isinstance(b, float):
-                        logging.warning(f"Body is float. Ignoring.")
-                        continue
-                    count = len(b.split())
-                    self.users.setdefault(a, 0)
-                    self.users[a] += count
-                    self.subreddits[subreddit_id] += count
+                count_words(df, subreddit_id, self.users, self.subreddits)
         with open(self.config.count_file, 'wb') as f:
             obj = {'subreddit': self.subreddits, 'user': self.users}
             pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def count_words(df, subreddit_id, users, subreddits):
+    """
+    Adds the number of words in each comment of 'df' to the count of its user
+    and of its subreddit, in place.
+
+    :param df: the downloaded Reddit data of one subreddit
+    :param subreddit_id: the ID of the subreddit
+    :param users: the word count of each user
+    :param subreddits: the word count of each subreddit
+    """
+    subreddits.setdefault(subreddit_id, 0)
+    for a, b in zip(df['author_fullname'], df['body']):
+        if isinstance(b, float):
+            logging.warning(f"Body is float. Ignoring.")
+            continue
+        count = len(b.split())
+        users.setdefault(a, 0)
+        users[a] += count
+        subreddits[subreddit_id] += count
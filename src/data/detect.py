@@ -1,3 +1,4 @@
+import numpy as np
 import logging
 import pickle
 import os
@@ -16,6 +17,7 @@ from utils.pathing import (
     EXISTING_FILE
 )
 from utils.timeline import TimelineConfig, Timeline
+from utils.data_management import save_usage_index
 from utils.config import CommandConfigBase
 
 
@@ -124,6 +126,8 @@ class BasicDetector:
         Detects novel words based on earliness and usage cutoffs and separates
         dying and surviving words based on a lateness cutoff. Also separates out
         the previously randomly-sampled existing words for later comparison.
+        Each output file gets a compact usage index saved next to it (see
+        utils.data_management.save_usage_index()).
 
         :param config: see BasicDetectorConfig for details
         """
@@ -133,59 +137,17 @@ class BasicDetector:
     def run(self) -> None:
         with open(self.config.usage_file, 'rb') as file:
             usage_dict = pickle.load(file)
-        cap_freq = self._aggregate_cap_freqs()
-        cap_freq = self._fix_cap_freq(cap_freq)
+        cap_freq = aggregate_cap_freqs(self.config.cap_data_dir)
         with open(self.config.existing_aux_file, 'rb') as file:
             existing_words = pickle.load(file)
-
-        # Detect new words.
-        min_cutoff = self.config.min_usage_cutoff
-        neologisms = dict((word, usage) for word, usage in usage_dict.items()
-                          if not self.timeline.is_early(usage[0])
-                          and min_cutoff <= len(usage[2])
-                          and cap_freq[word] > 0  # Not >=
-                          and word not in existing_words
-                          and self._is_ascii(word))
-
-        # Split surviving vs dying new words.
-        surviving, dying = {}, {}
-        for word, usage in neologisms.items():
-            if self.timeline.is_late(usage[1]):
-                surviving[word] = usage
-            else:
-                dying[word] = usage
+        surviving, dying, existing = detect_words(
+            usage_dict, self.timeline, cap_freq, existing_words,
+            self.config.min_usage_cutoff,
+            self.config.max_usage_cutoff_existing)
         self._save(surviving, self.config.surviving_file)
         self._save(dying, self.config.dying_file)
-
-        # Store usages for randomly-sampled existing words.
-        max_cutoff = self.config.max_usage_cutoff_existing
-        existing = dict((word, usage) for word, usage in usage_dict.items()
-                        if min_cutoff <= len(usage[2]) <= max_cutoff
-                        and cap_freq[word] > 0  # Not >=
-                        and word in existing_words
-                        and self._is_ascii(word))
         self._save(existing, self.config.existing_output_file)
 
-    def _aggregate_cap_freqs(self):
-        cap_freq = {}
-        for root, _, files in os.walk(self.config.cap_data_dir):
-            for file in files:
-                with open(makepath(root, file), 'rb') as f:
-                    cap_freq_file = pickle.load(f)
-                for word, cap_freq_word in cap_freq_file.items():
-                    cap_freq.setdefault(word, 0)
-                    cap_freq[word] += cap_freq_word
-        return cap_freq
-
-    @staticmethod
-    def _is_ascii(word):
-        try:
-            word.encode('ascii')
-            return True
-        except UnicodeEncodeError:
-            logging.debug(f"Removed non-ASCII word: {word}")
-            return False
-
     @staticmethod
     def _save(words, filename):
         with open(filename, 'wb') as file:
@@ -194,26 +156,101 @@ class BasicDetector:
             total_count = sum(counts_by_word.values())
             logging.debug(f"{os.path.split(filename)[1]}: {total_count}")
             pickle.dump(words, file, protocol=pickle.HIGHEST_PROTOCOL)
+        save_usage_index(words, filename)
 
-    @staticmethod
-    def _fix_cap_freq(cap_freq):
-        # NOTE: There's a bug in preprocess.py where the cap_freq data is stored
-        # using raw words, whereas the preprocessor then goes on to "collapse
-        # repeating letters to a maximum of 3." This means that some keys in
-        # cap_freq don't match keys in the usage_dict. Thankfully, these
-        # telescoping words are very rare, so it won't affect any final results
-        # in any meaningful way, but it still needs to be addressed to prevent
-        # runtime KeyErrors.
-        # NOTE: The reason for addressing it here and not in preprocess.py is
-        # that the later takes multiple wall clock days to run, and has already
-        # been run for the main experiment by the time the bug was discovered
-        # (with not enough time before the deadline to rerun it), whereas this
-        # detector takes almost no time to run by comparison.
-        import re
-
-        fixed_cap_freq = {}
-        for word, cap_freq_word in cap_freq.items():
-            collapsed_word = re.sub(r'(.)\1\1+', r'\1\1\1', word)
-            fixed_cap_freq.setdefault(collapsed_word, 0)
-            fixed_cap_freq[collapsed_word] += cap_freq_word
-        return fixed_cap_freq
+
+def detect_words(usage_dict, timeline, cap_freq, existing_words,
+                 min_usage_cutoff=1, max_usage_cutoff_existing=10000):
+    """
+    Detects novel words based on earliness and usage cutoffs, separating dying
+    and surviving words based on a lateness cutoff, and separates out the
+    randomly-sampled existing words. See BasicDetectorConfig for details.
+
+    :param usage_dict: the usages of the words among which to detect, as
+        given by the 'find' stage
+    :param timeline: the Timeline with the earliness and lateness cutoffs
+    :param cap_freq: the capitalization frequency of each word, as given by
+        aggregate_cap_freqs()
+    :param existing_words: the randomly-sampled existing words
+    :param min_usage_cutoff: the minimum number of occurrences of a word
+    :param max_usage_cutoff_existing: the maximum number of occurrences of an
+        existing word
+    :return: the surviving, dying and existing words, with their usages
+    """
+    # Detect new words.
+    firsts = np.array([usage[0] for usage in usage_dict.values()])
+    early = timeline.are_early(firsts)
+    neologisms = dict((word, usage) for (word, usage), is_early
+                      in zip(usage_dict.items(), early)
+                      if not is_early
+                      and min_usage_cutoff <= len(usage[2])
+                      and cap_freq[word] > 0  # Not >=
+                      and word not in existing_words
+                      and _is_ascii(word))
+
+    # Split surviving vs dying new words.
+    surviving, dying = {}, {}
+    lasts = np.array([usage[1] for usage in neologisms.values()])
+    late = timeline.are_late(lasts)
+    for (word, usage), is_late in zip(neologisms.items(), late):
+        if is_late:
+            surviving[word] = usage
+        else:
+            dying[word] = usage
+
+    # Keep usages for randomly-sampled existing words.
+    existing = dict((word, usage) for word, usage in usage_dict.items()
+                    if min_usage_cutoff <= len(usage[2])
+                    <= max_usage_cutoff_existing
+                    and cap_freq[word] > 0  # Not >=
+                    and word in existing_words
+                    and _is_ascii(word))
+    return surviving, dying, existing
+
+
+def aggregate_cap_freqs(cap_data_dir):
+    """
+    Returns the capitalization frequency of each word, summed over all the
+    auxiliary files of the 'preprocess' stage in 'cap_data_dir'.
+    """
+    cap_freq = {}
+    for root, _, files in os.walk(cap_data_dir):
+        for file in files:
+            with open(makepath(root, file), 'rb') as f:
+                cap_freq_file = pickle.load(f)
+            for word, cap_freq_word in cap_freq_file.items():
+                cap_freq.setdefault(word, 0)
+                cap_freq[word] += cap_freq_word
+    return _fix_cap_freq(cap_freq)
+
+
+def _is_ascii(word):
+    try:
+        word.encode('ascii')
+        return True
+    except UnicodeEncodeError:
+        logging.debug(f"Removed non-ASCII word: {word}")
+        return False
+
+
+def _fix_cap_freq(cap_freq):
+    # NOTE: There's a bug in preprocess.py where the cap_freq data is stored
+    # using raw words, whereas the preprocessor then goes on to "collapse
+    # repeating letters to a maximum of 3." This means that some keys in
+    # cap_freq don't match keys in the usage_dict. Thankfully, these
+    # telescoping words are very rare, so it won't affect any final results
+    # in any meaningful way, but it still needs to be addressed to prevent
+    # runtime KeyErrors.
+    # NOTE: The reason for addressing it here and not in preprocess.py is
+    # that the later takes multiple wall clock days to run, and has already
+    # been run for the main experiment by the time the bug was discovered
+    # (with not enough time before the deadline to rerun it), whereas this
+    # detector takes almost no time to run by comparison.
+    import re
+
+    fixed_cap_freq = {}
+    for word, cap_freq_word in cap_freq.items():
+        collapsed_word = re.sub(r'(.)\1\1+', r'\1\1\1', word)
+        fixed_cap_freq.setdefault(collapsed_word, 0)
+        fixed_cap_freq[collapsed_word] += cap_freq_word
+    return fixed_cap_freq
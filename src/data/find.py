@@ -78,18 +78,27 @@ class WordUsageFinder:
             for file in files:
                 self.mapper.new_file(file)
                 df = pd.read_csv(makepath(root, file))
-                for b, c in zip(df['body'], df['created_utc']):
-                    self._process(b, c)
+                find_usages(df, self.mapper, self.word_usage)
         with open(self.config.usage_file, 'wb') as file:
             pickle.dump(self.word_usage, file, protocol=pickle.HIGHEST_PROTOCOL)
         self.mapper.save(self.config.map_file)
 
-    def _process(self, body, created):
-        comment_id = self.mapper.new_row_id()  # Must happen before isnan().
+
+def find_usages(df, mapper, word_usage):
+    """
+    Records every usage of every word in the rows of 'df', in place. The file
+    of 'df' must be the last file registered with 'mapper'.
+
+    :param df: the preprocessed Reddit data of one file
+    :param mapper: the RowFileMapper assigning a unique ID to each row
+    :param word_usage: {word: [first usage, last usage, [usage IDs]]}
+    """
+    for body, created in zip(df['body'], df['created_utc']):
+        comment_id = mapper.new_row_id()  # Must happen before isnan().
         if isinstance(body, float) and math.isnan(body):
-            return
+            continue
         for word in body.split():
-            usage = self.word_usage.setdefault(word, [float('inf'), 0, []])
+            usage = word_usage.setdefault(word, [float('inf'), 0, []])
             usage[0] = min(created, usage[0])  # First usage.
             usage[1] = max(created, usage[1])  # Last usage.
             usage[2].append(comment_id)  # List of all usages.
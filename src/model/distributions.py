@@ -1,4 +1,8 @@
+from multiprocessing import Pool
+from functools import partial
 import pandas as pd
+import numpy as np
+import itertools
 import pickle
 
 from utils.pathing import (
@@ -10,13 +14,20 @@ from utils.pathing import (
     COUNT_DATA_DIR,
     USAGES_DATA_DIR,
     DIST_DIR,
+    BASE_DIST_DIR,
+    TIME_SERIES_DIR,
     SURVIVING_FILE,
     DYING_FILE,
     EXISTING_FILE,
+    SURVIVING_STORE,
+    DYING_STORE,
+    EXISTING_STORE,
     COUNT_FILE,
     ID_MAP_FILE
 )
 from utils.data_management import make_file_row_map, parts
+from model.entropy import compute_time_series, check_metrics, TSALLIS_Q
+from utils.ts_store import TimeSeriesStore
 from utils.timeline import TimelineConfig, Timeline
 from utils.config import CommandConfigBase
 
@@ -83,6 +94,56 @@ class DistributionsConfig(CommandConfigBase):
             Timeline configurations to use. Any given parameters override the
             defaults. See utils.timeline.TimelineConfig for details.
 
+        num_workers: (type: int, default: 1)
+            The number of worker processes among which to split the
+            preprocessed files. If 1, all files are processed serially in the
+            main process. The output is identical either way.
+
+        daily_base: (type: bool, default: False)
+            Whether to also materialize the raw (unnormalized) per-day counts
+            of every word in the same pass over the preprocessed data. The
+            'rollup' stage derives other time slicings from these without
+            touching the corpus again. Days are counted from the timeline start
+            and no usages are pruned.
+
+        base_dir: (type: Path-like, default: utils.pathing.BASE_DIST_DIR)
+            Directory (either absolute or relative to 'experiment_dir') in which
+            to store the daily base counts, if any. The files are named as for
+            the distributions (i.e., '*_output_file').
+
+        fused: (type: bool, default: False)
+            If True, the entropy time series are computed from the
+            distributions in memory and written directly to 'time_series_dir'
+            (as the 'time-series' stage would), instead of writing the
+            distributions to 'output_dir'. This skips writing and reading back
+            the distributions file. The full distributions are still built in
+            memory first, because a time slice's counts are complete only once
+            every file has been processed.
+
+        time_series_dir: (type: Path-like, default:
+                utils.pathing.TIME_SERIES_DIR)
+            Directory (either absolute or relative to 'experiment_dir') in which
+            to store the entropy time series output stores if 'fused'.
+
+        surviving_ts_store: (type: str, default: utils.pathing.SURVIVING_STORE)
+            Path (relative to 'time_series_dir') of the surviving new word
+            entropy time series output store if 'fused'.
+
+        dying_ts_store: (type: str, default: utils.pathing.DYING_STORE)
+            Path (relative to 'time_series_dir') of the dying new word entropy
+            time series output store if 'fused'.
+
+        existing_ts_store: (type: str, default: utils.pathing.EXISTING_STORE)
+            Path (relative to 'time_series_dir') of the existing word entropy
+            time series output store if 'fused'.
+
+        metrics: (type: list[str], default: ["shannon"])
+            The entropy metrics to compute if 'fused'. See
+            model.time_series.TimeSeriesConfig for details.
+
+        tsallis_q: (type: float, default: model.entropy.TSALLIS_Q)
+            The entropic index of the 'tsallis' metric if 'fused'.
+
         :param kwargs: optional configs to overwrite defaults (see above)
         """
         self.experiment_dir = kwargs.pop('experiment_dir', EXPERIMENT_DIR)
@@ -103,8 +164,24 @@ class DistributionsConfig(CommandConfigBase):
         self.existing_output_file = kwargs.pop(
             'existing_output_file', EXISTING_FILE)
         self.timeline_config = kwargs.pop('timeline_config', {})
+        self.num_workers = kwargs.pop('num_workers', 1)
+        self.daily_base = kwargs.pop('daily_base', False)
+        self.base_dir = kwargs.pop('base_dir', BASE_DIST_DIR)
+        self.fused = kwargs.pop('fused', False)
+        self.time_series_dir = kwargs.pop('time_series_dir', TIME_SERIES_DIR)
+        self.surviving_ts_store = kwargs.pop(
+            'surviving_ts_store', SURVIVING_STORE)
+        self.dying_ts_store = kwargs.pop('dying_ts_store', DYING_STORE)
+        self.existing_ts_store = kwargs.pop(
+            'existing_ts_store', EXISTING_STORE)
+        self.metrics = kwargs.pop('metrics', ["shannon"])
+        self.tsallis_q = kwargs.pop('tsallis_q', TSALLIS_Q)
         super().__init__(**kwargs)
 
+        if self.num_workers < 1:
+            raise ValueError("'num_workers' must be positive")
+        check_metrics(self.metrics, self.tsallis_q)
+
     def make_paths_absolute(self):
         paths = ExperimentPaths(
             experiment_dir=self.experiment_dir,
@@ -112,7 +189,9 @@ class DistributionsConfig(CommandConfigBase):
             neo_data_dir=self.neo_dir,
             count_data_dir=self.count_dir,
             usages_data_dir=self.usages_dir,
-            dist_dir=self.output_dir
+            dist_dir=self.output_dir,
+            base_dist_dir=self.base_dir,
+            time_series_dir=self.time_series_dir
         )
         self.experiment_dir = paths.experiment_dir
         self.preproc_dir = paths.preproc_data_dir
@@ -125,6 +204,12 @@ class DistributionsConfig(CommandConfigBase):
         self.count_file = makepath(self.count_dir, self.count_file)
         self.usages_dir = paths.usages_data_dir
         self.map_file = makepath(self.usages_dir, self.map_file)
+        self.base_dir = paths.base_dist_dir
+        self.surviving_base_file = makepath(
+            self.base_dir, self.surviving_output_file)
+        self.dying_base_file = makepath(self.base_dir, self.dying_output_file)
+        self.existing_base_file = makepath(
+            self.base_dir, self.existing_output_file)
         self.output_dir = paths.dist_dir
         self.surviving_output_file = makepath(
             self.output_dir, self.surviving_output_file)
@@ -132,6 +217,13 @@ class DistributionsConfig(CommandConfigBase):
             self.output_dir, self.dying_output_file)
         self.existing_output_file = makepath(
             self.output_dir, self.existing_output_file)
+        self.time_series_dir = paths.time_series_dir
+        self.surviving_ts_store = makepath(
+            self.time_series_dir, self.surviving_ts_store)
+        self.dying_ts_store = makepath(
+            self.time_series_dir, self.dying_ts_store)
+        self.existing_ts_store = makepath(
+            self.time_series_dir, self.existing_ts_store)
         return self
 
 
@@ -139,55 +231,161 @@ class Distributions:
     def __init__(self, config: DistributionsConfig):
         """
         Computes user and subreddit word frequency distributions for all novel
-        words and for each time slice as specified by a Timeline.
+        words and for each time slice as specified by a Timeline. Optionally,
+        also materializes the raw per-day counts, or directly computes the
+        entropy time series instead (see DistributionsConfig).
 
         :param config: see DistributionsConfig for details
         """
         self.config = config
-        self.timeline = Timeline(TimelineConfig(**self.config.timeline_config))
+        tl_config = TimelineConfig(**self.config.timeline_config)
+        self.timeline = Timeline(tl_config)
+        self.day_timeline = None
+        if self.config.daily_base:
+            self.day_timeline = Timeline(TimelineConfig(**dict(
+                self.config.timeline_config, early=0, late=0,
+                slice_size='day')))
         with open(self.config.count_file, 'rb') as file:
             self.count = pickle.load(file)
 
     def run(self) -> None:
         config = self.config
-        self._do_run(config.surviving_neo_file, config.surviving_output_file)
-        self._do_run(config.dying_neo_file, config.dying_output_file)
-        self._do_run(config.existing_neo_file, config.existing_output_file)
+        fused = config.fused
+        self._do_run(config.surviving_neo_file,
+                     config.surviving_ts_store if fused
+                     else config.surviving_output_file,
+                     config.surviving_base_file)
+        self._do_run(config.dying_neo_file,
+                     config.dying_ts_store if fused
+                     else config.dying_output_file,
+                     config.dying_base_file)
+        self._do_run(config.existing_neo_file,
+                     config.existing_ts_store if fused
+                     else config.existing_output_file,
+                     config.existing_base_file)
 
-    def _do_run(self, input_path, output_path):
+    def _do_run(self, input_path, output_path, base_path):
         file_map = make_file_row_map(input_path, self.config.map_file)
-        dists = {}  # Can't use defaultdict because we need to pickle after.
-        for file, row_map in file_map.items():
-            self._process_file(file, row_map, dists)
-        self._normalize(dists)
+        tasks = [(file, dict(row_map)) for file, row_map in file_map.items()]
+        # Can't use defaultdict because we need to pickle after.
+        dists, base = {}, {}
+        if self.config.num_workers == 1:
+            _process_files(self.config.preproc_dir, self.timeline,
+                           self.day_timeline, tasks, dists, base)
+        else:
+            # Contiguous chunks merged in order give the same insertion order
+            # (and hence the same output) as the serial run.
+            size = max(1, -(-len(tasks) // (4 * self.config.num_workers)))
+            chunks = [tasks[i:i + size] for i in range(0, len(tasks), size)]
+            worker = partial(_process_files, self.config.preproc_dir,
+                             self.timeline, self.day_timeline)
+            with Pool(self.config.num_workers) as pool:
+                for partial_dists, partial_base in pool.imap(worker, chunks):
+                    merge(dists, partial_dists)
+                    merge(base, partial_base)
+        if self.day_timeline is not None:
+            with open(base_path, 'wb') as file:
+                pickle.dump(base, file, protocol=pickle.HIGHEST_PROTOCOL)
+        normalize(dists, self.count)
+        if self.config.fused:
+            time_series = compute_time_series(
+                dists, self.config.metrics, self.config.tsallis_q, self.count)
+            TimeSeriesStore.from_dict(time_series).save(output_path)
+            return
         with open(output_path, 'wb') as file:
             pickle.dump(dists, file, protocol=pickle.HIGHEST_PROTOCOL)
 
-    def _process_file(self, file, row_map, dists):
-        df = pd.read_csv(makepath(self.config.preproc_dir, file))
+
+def merge(dists, partial_dists):
+    """
+    Adds the counts of 'partial_dists' into 'dists' in place. Both have the
+    same {word: {time_slice: {dist_name: {key: count}}}} structure.
+    """
+    for word, partial_slices in partial_dists.items():
+        all_slices = dists.setdefault(word, {})
+        for time_slice, partial_all_dists in partial_slices.items():
+            all_dists = all_slices.setdefault(time_slice, {})
+            for dist_name, partial_dist in partial_all_dists.items():
+                dist = all_dists.setdefault(dist_name, {})
+                for key, count in partial_dist.items():
+                    dist[key] = dist.get(key, 0) + count
+
+
+def normalize(dists, count):
+    """
+    Normalizes the raw counts of 'dists' in place by the total word count of
+    each user and of each subreddit, as given by the 'count' stage.
+    """
+    user_count = count['user']
+    subreddit_count = count['subreddit']
+    for all_slices in dists.values():
+        for all_dists in all_slices.values():
+            user, subreddit = all_dists['user'], all_dists['subreddit']
+            for author_fullname in user:
+                user[author_fullname] /= user_count[author_fullname]
+            for subreddit_id in subreddit:
+                subreddit[subreddit_id] /= subreddit_count[subreddit_id]
+
+
+def denormalize(dists, count):
+    """
+    Inverse of 'normalize()': recovers the raw counts of 'dists' in place,
+    given the same 'count' that was used to normalize them.
+    """
+    user_count = count['user']
+    subreddit_count = count['subreddit']
+    for all_slices in dists.values():
+        for all_dists in all_slices.values():
+            user, subreddit = all_dists['user'], all_dists['subreddit']
+            for author_fullname in user:
+                user[author_fullname] = round(
+                    user[author_fullname] * user_count[author_fullname])
+            for subreddit_id in subreddit:
+                subreddit[subreddit_id] = round(
+                    subreddit[subreddit_id] * subreddit_count[subreddit_id])
+
+
+def _process_files(preproc_dir, timeline, day_timeline, tasks, dists=None,
+                   base=None):
+    """
+    Counts (without normalizing) the user and subreddit word frequencies of
+    each time slice for the given preprocessed files. Defined at module level
+    so that it can be sent to worker processes.
+
+    :param preproc_dir: directory containing the preprocessed files
+    :param timeline: the Timeline by which to slice the usages
+    :param day_timeline: a daily Timeline for the base counts, or None to skip
+    :param tasks: a list of (file, row_map) pairs to process, in order
+    :param dists: the counts to update in place, or None to start fresh
+    :param base: the daily base counts to update in place, or None to start
+        fresh (left empty if 'day_timeline' is None)
+    :return: the updated counts and daily base counts
+    """
+    dists = {} if dists is None else dists
+    base = {} if base is None else base
+    for file, row_map in tasks:
+        df = pd.read_csv(makepath(preproc_dir, file))
         subreddit_id = parts(file)['subreddit_id']
-        for row_id, word_list in row_map.items():
-            row = df.iloc[[row_id]]
-            author_fullname = row['author_fullname'].item()
-            timestamp = row['created_utc'].item()
-            if self.timeline.is_early(timestamp):  # Prunes existing, if needed.
-                continue
-            time_slice = self.timeline.slice_of(timestamp)
-            for word in word_list:
-                all_slices = dists.setdefault(word, {})
-                all_dists = all_slices.setdefault(time_slice, {})
-                user = all_dists.setdefault('user', {})
-                user[author_fullname] = user.get(author_fullname, 0) + 1
-                subreddit = all_dists.setdefault('subreddit', {})
-                subreddit[subreddit_id] = subreddit.get(subreddit_id, 0) + 1
-
-    def _normalize(self, dists):
-        user_count = self.count['user']
-        subreddit_count = self.count['subreddit']
-        for all_slices in dists.values():
-            for all_dists in all_slices.values():
-                user, subreddit = all_dists['user'], all_dists['subreddit']
-                for author_fullname in user:
-                    user[author_fullname] /= user_count[author_fullname]
-                for subreddit_id in subreddit:
-                    subreddit[subreddit_id] /= subreddit_count[subreddit_id]
+        row_ids = np.fromiter(row_map.keys(), dtype=np.int64)
+        timestamps = df['created_utc'].to_numpy()[row_ids]
+        authors = df['author_fullname'].to_numpy()[row_ids]
+        if day_timeline is not None:
+            days = day_timeline.slices_of(timestamps).tolist()
+            _count(base, row_map.values(), authors, subreddit_id, days)
+        keep = ~timeline.are_early(timestamps)  # Prunes existing, if needed.
+        time_slices = timeline.slices_of(timestamps[keep]).tolist()
+        word_lists = itertools.compress(row_map.values(), keep)
+        _count(dists, word_lists, authors[keep], subreddit_id, time_slices)
+    return dists, base
+
+
+def _count(dists, word_lists, authors, subreddit_id, time_slices):
+    for word_list, author_fullname, time_slice in zip(
+            word_lists, authors, time_slices):
+        for word in word_list:
+            all_slices = dists.setdefault(word, {})
+            all_dists = all_slices.setdefault(time_slice, {})
+            user = all_dists.setdefault('user', {})
+            user[author_fullname] = user.get(author_fullname, 0) + 1
+            subreddit = all_dists.setdefault('subreddit', {})
+            subreddit[subreddit_id] = subreddit.get(subreddit_id, 0) + 1
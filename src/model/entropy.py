@@ -0,0 +1,209 @@
+import numpy as np
+
+TSALLIS_Q = 1.5
+
+
+def compute_time_series(dists, metrics=('shannon',), tsallis_q=TSALLIS_Q,
+                        count=None):
+    """
+    Computes the entropy time series of every word from its word frequency
+    distributions in one vectorized sweep, for every selected metric.
+
+    Each word's time series starts at its first time slice and ends at its
+    last. Time slices in between without any usage have an entropy of 0.0, as
+    do distributions with a single element.
+
+    :param dists: {word: {time_slice: {dist_name: {key: freq}}}}
+    :param metrics: the names of the metrics to compute (see METRICS)
+    :param tsallis_q: the entropic index of the 'tsallis' metric
+    :param count: the user and subreddit count file contents, by which 'dists'
+        were normalized; only needed for 'miller_madow'
+    :return: {word: {dist_name: [entropy of each time slice]}}, where the
+        'shannon' time series are keyed by 'dist_name' alone, and those of
+        every other metric by '<dist_name>_<metric>'
+    """
+    check_metrics(metrics, tsallis_q)
+    terms = {term for metric in metrics for term in METRICS[metric][0]}
+    if 'n' in terms and count is None:
+        raise ValueError("'miller_madow' needs the user and subreddit counts")
+    freqs, offsets, cells, raw = flatten(dists, count if 'n' in terms else None)
+    sums, sizes = segment_reductions(freqs, offsets, raw, terms, tsallis_q)
+    time_series = {}
+    for metric in metrics:
+        values = METRICS[metric][1](sums, sizes, tsallis_q).tolist()
+        if metric == 'shannon':
+            metric_cells = cells
+        else:
+            metric_cells = [(word, index, f"{dist_name}_{metric}")
+                            for word, index, dist_name in cells]
+        for word, all_time_series in assemble(metric_cells, values).items():
+            time_series.setdefault(word, {}).update(all_time_series)
+    return time_series
+
+
+def check_metrics(metrics, tsallis_q):
+    """
+    Raises a ValueError if any metric is unknown or 'tsallis_q' is invalid.
+    """
+    for metric in metrics:
+        if metric not in METRICS:
+            raise ValueError(f"unknown metric '{metric}', must be one of "
+                             f"{list(METRICS)}")
+    if 'tsallis' in metrics and (tsallis_q <= 0 or tsallis_q == 1):
+        raise ValueError("must have 0 < tsallis_q != 1")
+
+
+def flatten(dists, count=None):
+    """
+    Concatenates the frequencies of all distributions into one flat array.
+
+    :param dists: {word: {time_slice: {dist_name: {key: freq}}}}
+    :param count: if given, the counts by which 'dists' were normalized, to
+        also recover the raw counts of each frequency
+    :return: the flat frequencies, the offset at which each distribution's
+        segment starts, the (word, time_slice, dist_name) of each segment and
+        the flat raw counts (None if 'count' is None)
+    """
+    freqs, offsets, cells = [], [], []
+    norms = None if count is None else []
+    for word, time_slices in dists.items():
+        for index, all_dists in time_slices.items():
+            for dist_name, dist in all_dists.items():
+                offsets.append(len(freqs))
+                freqs.extend(dist.values())
+                cells.append((word, int(index), dist_name))
+                if norms is not None:
+                    norms.extend(map(count[dist_name].__getitem__, dist))
+    freqs = np.array(freqs, dtype=float)
+    raw = None if norms is None else np.rint(freqs * np.array(norms))
+    return freqs, np.array(offsets, dtype=int), cells, raw
+
+
+def segment_reductions(freqs, offsets, raw=None, terms=('f', 'flogf'),
+                       tsallis_q=TSALLIS_Q):
+    """
+    Reduces each segment of 'freqs' to the sums needed by the metrics.
+
+    :param freqs: the flat frequencies of all distributions
+    :param offsets: the offset at which each distribution's segment starts
+    :param raw: the flat raw counts of all distributions, if 'n' is in 'terms'
+    :param terms: the names of the per-element terms to sum (see TERMS)
+    :param tsallis_q: the entropic index used by the 'fq' term
+    :return: {term: the sum of that term over each segment}, and the support
+        size of each segment
+    """
+    sizes = np.diff(np.append(offsets, len(freqs)))
+    nonempty = sizes > 0  # reduceat() can't represent empty segments.
+    starts = offsets[nonempty]
+    sums = {}
+    for term in terms:
+        sums[term] = np.zeros(len(offsets))
+        if len(starts):
+            values = TERMS[term](freqs, raw, tsallis_q)
+            sums[term][nonempty] = np.add.reduceat(values, starts)
+    return sums, sizes
+
+
+def normalized_entropy(sums, flogfs, sizes):
+    """
+    Computes the Shannon entropy of each segment (in bits) from its
+    reductions, normalized by the maximum entropy for its support size.
+    Segments with fewer than two elements have an entropy of 0.0.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        entropy = np.log2(sums) - flogfs / sums
+        norm_entropy = entropy / np.log2(sizes)
+    return np.where(sizes > 1, norm_entropy, 0.0)
+
+
+def normalized_renyi2(sums, f2s, sizes):
+    """
+    Computes the Renyi entropy of order 2 (collision entropy) of each segment,
+    normalized by the maximum entropy for its support size.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        entropy = 2 * np.log2(sums) - np.log2(f2s)
+        norm_entropy = entropy / np.log2(sizes)
+    return np.where(sizes > 1, norm_entropy, 0.0)
+
+
+def normalized_tsallis(sums, fqs, sizes, q):
+    """
+    Computes the Tsallis entropy of index 'q' of each segment, normalized by
+    the maximum entropy for its support size.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        norm_entropy = (1 - fqs / sums ** q) / (1 - sizes ** (1.0 - q))
+    return np.where(sizes > 1, norm_entropy, 0.0)
+
+
+def normalized_gini_simpson(sums, f2s, sizes):
+    """
+    Computes the Gini-Simpson index of each segment, normalized by the maximum
+    index for its support size.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        norm_index = (1 - f2s / sums ** 2) / (1 - 1 / sizes)
+    return np.where(sizes > 1, norm_index, 0.0)
+
+
+def normalized_miller_madow(sums, flogfs, sizes, ns):
+    """
+    Computes the Miller-Madow bias-corrected Shannon entropy of each segment
+    (in bits), normalized by the maximum entropy for its support size. The
+    correction of (support size - 1) / 2N nats uses the raw number of usages
+    N, so results can slightly exceed 1.0 for small samples.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        correction = (sizes - 1) / (2 * ns * np.log(2))
+        norm_entropy = correction / np.log2(sizes)
+    norm_entropy = np.where(sizes > 1, norm_entropy, 0.0)
+    return normalized_entropy(sums, flogfs, sizes) + norm_entropy
+
+
+def assemble(cells, values):
+    """
+    Arranges per-segment values into per-word time series.
+
+    :param cells: the (word, time_slice, dist_name) of each value
+    :param values: the value of each segment
+    :return: {word: {dist_name: [value of each time slice]}}
+    """
+    bounds = {}
+    for word, index, _ in cells:
+        low, high = bounds.get(word, (index, index))
+        bounds[word] = min(low, index), max(high, index)
+    time_series = {}
+    for (word, index, dist_name), value in zip(cells, values):
+        offset, last = bounds[word]
+        all_time_series = time_series.setdefault(word, {})
+        if dist_name not in all_time_series:
+            all_time_series[dist_name] = [0.0] * (last - offset + 1)
+        all_time_series[dist_name][index - offset] = value
+    return time_series
+
+
+# Per-element terms whose per-segment sums the metrics are computed from. Each
+# is reduced at most once per sweep, however many metrics share it.
+TERMS = {
+    'f': lambda freqs, raw, q: freqs,
+    'flogf': lambda freqs, raw, q: freqs * np.log2(freqs),
+    'f2': lambda freqs, raw, q: freqs * freqs,
+    'fq': lambda freqs, raw, q: freqs ** q,
+    'n': lambda freqs, raw, q: raw
+}
+
+# Metric name -> (the terms it needs, its function of those terms' sums, the
+# support sizes and the Tsallis entropic index).
+METRICS = {
+    'shannon': (('f', 'flogf'), lambda s, sizes, q: normalized_entropy(
+        s['f'], s['flogf'], sizes)),
+    'renyi2': (('f', 'f2'), lambda s, sizes, q: normalized_renyi2(
+        s['f'], s['f2'], sizes)),
+    'tsallis': (('f', 'fq'), lambda s, sizes, q: normalized_tsallis(
+        s['f'], s['fq'], sizes, q)),
+    'gini_simpson': (('f', 'f2'), lambda s, sizes, q: normalized_gini_simpson(
+        s['f'], s['f2'], sizes)),
+    'miller_madow': (('f', 'flogf', 'n'), lambda s, sizes, q:
+                     normalized_miller_madow(s['f'], s['flogf'], sizes, s['n']))
+}
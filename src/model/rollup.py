@@ -0,0 +1,213 @@
+from datetime import timedelta
+import pickle
+
+from utils.pathing import (
+    makepath,
+    ensure_path,
+    ExperimentPaths,
+    EXPERIMENT_DIR,
+    BASE_DIST_DIR,
+    COUNT_DATA_DIR,
+    TIME_SERIES_DIR,
+    SURVIVING_FILE,
+    DYING_FILE,
+    EXISTING_FILE,
+    SURVIVING_STORE,
+    DYING_STORE,
+    EXISTING_STORE,
+    COUNT_FILE
+)
+from model.distributions import merge, normalize
+from model.entropy import compute_time_series, check_metrics, TSALLIS_Q
+from utils.timeline import TimelineConfig, Timeline
+from utils.ts_store import TimeSeriesStore
+from utils.config import CommandConfigBase
+
+
+class RollUpConfig(CommandConfigBase):
+    def __init__(self, **kwargs):
+        """
+        Configs for the RollUp class. Accepted kwargs are:
+
+        experiment_dir: (type: Path-like, default: utils.pathing.EXPERIMENT_DIR)
+            Directory (either relative to utils.pathing.EXPERIMENTS_ROOT_DIR or
+            absolute) representing the currently-running experiment.
+
+        input_dir: (type: Path-like, default: utils.pathing.BASE_DIST_DIR)
+            Directory (either absolute or relative to 'experiment_dir') from
+            which to read the daily base counts.
+
+        surviving_input_file: (type: str, default: utils.pathing.SURVIVING_FILE)
+            Path (relative to 'input_dir') of the surviving new word daily base
+            counts file.
+
+        dying_input_file: (type: str, default: utils.pathing.DYING_FILE)
+            Path (relative to 'input_dir') of the dying new word daily base
+            counts file.
+
+        existing_input_file: (type: str, default: utils.pathing.EXISTING_FILE)
+            Path (relative to 'input_dir') of the randomly-sampled existing
+            word daily base counts file.
+
+        count_dir: (type: Path-like, default: utils.pathing.COUNT_DATA_DIR)
+            Directory (either absolute or relative to 'experiment_dir') from
+            which to read 'count_file'.
+
+        count_file: (type: str, default: utils.pathing.COUNT_FILE)
+            Path (relative to 'count_dir') of the user and subreddit count file.
+
+        output_dir: (type: Path-like, default: utils.pathing.TIME_SERIES_DIR)
+            Directory (either absolute or relative to 'experiment_dir') in which
+            to store all the output files. Each resolution gets its own
+            sub-directory, named after the resolution.
+
+        surviving_output_file: (type: str, default:
+                utils.pathing.SURVIVING_STORE)
+            Path (relative to each resolution's sub-directory of 'output_dir')
+            of the surviving new word entropy time series output store.
+
+        dying_output_file: (type: str, default: utils.pathing.DYING_STORE)
+            Path (relative to each resolution's sub-directory of 'output_dir')
+            of the dying new word entropy time series output store.
+
+        existing_output_file: (type: str, default:
+                utils.pathing.EXISTING_STORE)
+            Path (relative to each resolution's sub-directory of 'output_dir')
+            of the existing word entropy time series output store.
+
+        resolutions: (type: list[dict], default: [
+                {"name": "week", "width": 7},
+                {"name": "month", "width": 30}])
+            The time resolutions for which to compute entropy time series. Each
+            resolution has a 'name', a 'width' (the number of days in each time
+            slice) and an optional 'stride' (the number of days between the
+            starts of consecutive time slices). If 'stride' is missing, it
+            equals 'width', giving contiguous slices. Otherwise, it must be
+            smaller than 'width', giving overlapping sliding windows.
+
+        timeline_config: (type: dict, default: {})
+            Timeline configurations to use. Must match those of the 'dists'
+            stage that produced the daily base counts. Only 'start', 'early' and
+            'slice_size' are used: usages falling in the first 'early' slices
+            (of size 'slice_size') are pruned, as in the 'dists' stage. These
+            slices must span a whole number of days. See
+            utils.timeline.TimelineConfig for details.
+
+        metrics: (type: list[str], default: ["shannon"])
+            The entropy metrics to compute. See
+            model.time_series.TimeSeriesConfig for details.
+
+        tsallis_q: (type: float, default: model.entropy.TSALLIS_Q)
+            The entropic index of the 'tsallis' metric.
+
+        :param kwargs: optional configs to overwrite defaults (see above)
+        """
+        self.experiment_dir = kwargs.pop('experiment_dir', EXPERIMENT_DIR)
+        self.input_dir = kwargs.pop('input_dir', BASE_DIST_DIR)
+        self.surviving_input_file = kwargs.pop(
+            'surviving_input_file', SURVIVING_FILE)
+        self.dying_input_file = kwargs.pop('dying_input_file', DYING_FILE)
+        self.existing_input_file = kwargs.pop(
+            'existing_input_file', EXISTING_FILE)
+        self.count_dir = kwargs.pop('count_dir', COUNT_DATA_DIR)
+        self.count_file = kwargs.pop('count_file', COUNT_FILE)
+        self.output_dir = kwargs.pop('output_dir', TIME_SERIES_DIR)
+        self.surviving_output_file = kwargs.pop(
+            'surviving_output_file', SURVIVING_STORE)
+        self.dying_output_file = kwargs.pop('dying_output_file', DYING_STORE)
+        self.existing_output_file = kwargs.pop(
+            'existing_output_file', EXISTING_STORE)
+        self.resolutions = kwargs.pop('resolutions', [
+            {"name": "week", "width": 7},
+            {"name": "month", "width": 30}
+        ])
+        self.timeline_config = kwargs.pop('timeline_config', {})
+        self.metrics = kwargs.pop('metrics', ["shannon"])
+        self.tsallis_q = kwargs.pop('tsallis_q', TSALLIS_Q)
+        super().__init__(**kwargs)
+
+        check_metrics(self.metrics, self.tsallis_q)
+
+        for resolution in self.resolutions:
+            width = resolution['width']
+            stride = resolution.get('stride', width)
+            if not 1 <= stride <= width:
+                raise ValueError("must have 1 <= stride <= width")
+
+        # Daily base counts can only be pruned by whole days.
+        tl_config = TimelineConfig(**self.timeline_config)
+        slice_size = tl_config.slice_size_options[tl_config.slice_size]
+        if tl_config.early * slice_size % timedelta(days=1):
+            raise ValueError("the first 'early' time slices of the timeline "
+                             "must span a whole number of days")
+
+    def make_paths_absolute(self):
+        paths = ExperimentPaths(
+            experiment_dir=self.experiment_dir,
+            base_dist_dir=self.input_dir,
+            count_data_dir=self.count_dir,
+            time_series_dir=self.output_dir
+        )
+        self.experiment_dir = paths.experiment_dir
+        self.input_dir = paths.base_dist_dir
+        self.surviving_input_file = makepath(
+            self.input_dir, self.surviving_input_file)
+        self.dying_input_file = makepath(self.input_dir, self.dying_input_file)
+        self.existing_input_file = makepath(
+            self.input_dir, self.existing_input_file)
+        self.count_dir = paths.count_data_dir
+        self.count_file = makepath(self.count_dir, self.count_file)
+        self.output_dir = paths.time_series_dir
+        return self
+
+
+class RollUp:
+    def __init__(self, config: RollUpConfig):
+        """
+        Derives the user and subreddit word frequency distributions of coarser
+        (or sliding) time slices from the daily base counts of the 'dists'
+        stage, and computes the entropy time series of every configured
+        resolution in one run, without touching the corpus.
+
+        :param config: see RollUpConfig for details
+        """
+        self.config = config
+        timeline = Timeline(TimelineConfig(**self.config.timeline_config))
+        self.early_days = (timeline.config.early * timeline.slice_size) // \
+            timedelta(days=1)
+        with open(self.config.count_file, 'rb') as file:
+            self.count = pickle.load(file)
+
+    def run(self) -> None:
+        config = self.config
+        self._do_run(config.surviving_input_file, config.surviving_output_file)
+        self._do_run(config.dying_input_file, config.dying_output_file)
+        self._do_run(config.existing_input_file, config.existing_output_file)
+
+    def _do_run(self, input_file, output_file):
+        with open(input_file, 'rb') as file:
+            base = pickle.load(file)
+        for resolution in self.config.resolutions:
+            dists = self._roll_up(
+                base, resolution['width'],
+                resolution.get('stride', resolution['width']))
+            normalize(dists, self.count)
+            time_series = compute_time_series(
+                dists, self.config.metrics, self.config.tsallis_q, self.count)
+            output_dir = ensure_path(
+                makepath(self.config.output_dir, resolution['name']))
+            TimeSeriesStore.from_dict(time_series).save(
+                makepath(output_dir, output_file))
+
+    def _roll_up(self, base, width, stride):
+        dists = {}
+        for word, days in base.items():
+            for day in sorted(days):
+                if day < self.early_days:  # Prunes existing, if needed.
+                    continue
+                # Day belongs to every window j with j*stride <= day < j*stride
+                # + width. With stride == width, that's just day // width.
+                for window in range(max(0, (day - width) // stride + 1),
+                                    day // stride + 1):
+                    merge(dists, {word: {window: days[day]}})
+        return dists
@@ -1,4 +1,3 @@
-import numpy as np
 import pickle
 
 from utils.pathing import (
@@ -6,11 +5,18 @@ from utils.pathing import (
     ExperimentPaths,
     EXPERIMENT_DIR,
     DIST_DIR,
+    COUNT_DATA_DIR,
     TIME_SERIES_DIR,
     SURVIVING_FILE,
     DYING_FILE,
-    EXISTING_FILE
+    EXISTING_FILE,
+    SURVIVING_STORE,
+    DYING_STORE,
+    EXISTING_STORE,
+    COUNT_FILE
 )
+from model.entropy import compute_time_series, check_metrics, TSALLIS_Q
+from utils.ts_store import TimeSeriesStore
 from utils.config import CommandConfigBase
 
 
@@ -44,17 +50,37 @@ class TimeSeriesConfig(CommandConfigBase):
             to store all the output files.
 
         surviving_output_file: (type: str, default:
-                utils.pathing.SURVIVING_FILE)
+                utils.pathing.SURVIVING_STORE)
             Path (relative to 'output_dir') of the surviving new word entropy
-            time series output file.
+            time series output store. See utils.ts_store.TimeSeriesStore.
 
-        dying_output_file: (type: str, default: utils.pathing.DYING_FILE)
+        dying_output_file: (type: str, default: utils.pathing.DYING_STORE)
             Path (relative to 'output_dir') of the dying new word entropy time
-            series output file.
+            series output store. See utils.ts_store.TimeSeriesStore.
 
-        existing_output_file: (type: str, default: utils.pathing.EXISTING_FILE)
+        existing_output_file: (type: str, default:
+                utils.pathing.EXISTING_STORE)
             Path (relative to 'output_dir') of the existing word entropy time
-            series output file.
+            series output store. See utils.ts_store.TimeSeriesStore.
+
+        metrics: (type: list[str], default: ["shannon"])
+            The entropy metrics to compute, all in the same sweep. Any of
+            'shannon', 'renyi2', 'tsallis', 'gini_simpson' and 'miller_madow'
+            (see model.entropy.METRICS). The 'shannon' time series are stored
+            as 'user' and 'subreddit'; those of every other metric as, e.g.,
+            'user_renyi2' and 'subreddit_renyi2'.
+
+        tsallis_q: (type: float, default: model.entropy.TSALLIS_Q)
+            The entropic index of the 'tsallis' metric. Must be positive and
+            different from 1.
+
+        count_dir: (type: Path-like, default: utils.pathing.COUNT_DATA_DIR)
+            Directory (either absolute or relative to 'experiment_dir') from
+            which to read 'count_file'. Only used by 'miller_madow', which needs
+            the raw (unnormalized) number of usages.
+
+        count_file: (type: str, default: utils.pathing.COUNT_FILE)
+            Path (relative to 'count_dir') of the user and subreddit count file.
 
         :param kwargs: optional configs to overwrite defaults (see above)
         """
@@ -67,17 +93,24 @@ class TimeSeriesConfig(CommandConfigBase):
             'existing_input_file', EXISTING_FILE)
         self.output_dir = kwargs.pop('output_dir', TIME_SERIES_DIR)
         self.surviving_output_file = kwargs.pop(
-            'surviving_output_file', SURVIVING_FILE)
-        self.dying_output_file = kwargs.pop('dying_output_file', DYING_FILE)
+            'surviving_output_file', SURVIVING_STORE)
+        self.dying_output_file = kwargs.pop('dying_output_file', DYING_STORE)
         self.existing_output_file = kwargs.pop(
-            'existing_output_file', EXISTING_FILE)
+            'existing_output_file', EXISTING_STORE)
+        self.metrics = kwargs.pop('metrics', ["shannon"])
+        self.tsallis_q = kwargs.pop('tsallis_q', TSALLIS_Q)
+        self.count_dir = kwargs.pop('count_dir', COUNT_DATA_DIR)
+        self.count_file = kwargs.pop('count_file', COUNT_FILE)
         super().__init__(**kwargs)
 
+        check_metrics(self.metrics, self.tsallis_q)
+
     def make_paths_absolute(self):
         paths = ExperimentPaths(
             experiment_dir=self.experiment_dir,
             dist_dir=self.input_dir,
-            time_series_dir=self.output_dir
+            time_series_dir=self.output_dir,
+            count_data_dir=self.count_dir
         )
         self.experiment_dir = paths.experiment_dir
         self.input_dir = paths.dist_dir
@@ -93,6 +126,8 @@ class TimeSeriesConfig(CommandConfigBase):
             self.output_dir, self.dying_output_file)
         self.existing_output_file = makepath(
             self.output_dir, self.existing_output_file)
+        self.count_dir = paths.count_data_dir
+        self.count_file = makepath(self.count_dir, self.count_file)
         return self
 
 
@@ -101,11 +136,15 @@ class TimeSeries:
         """
         Computes user and subreddit entropy time series representation from the
         word frequency distributions for all words over the time slice specified
-        by a Timeline.
+        by a Timeline, for every selected entropy metric.
 
         :param config: see TimeSeriesConfig for details
         """
         self.config = config
+        self.count = None
+        if 'miller_madow' in self.config.metrics:
+            with open(self.config.count_file, 'rb') as file:
+                self.count = pickle.load(file)
 
     def run(self) -> None:
         config = self.config
@@ -116,24 +155,6 @@ class TimeSeries:
     def _do_run(self, input_file, output_file):
         with open(input_file, 'rb') as file:
             dists = pickle.load(file)
-        time_series = {word: self._process(dists[word]) for word in dists}
-        with open(output_file, 'wb') as file:
-            pickle.dump(time_series, file, protocol=pickle.HIGHEST_PROTOCOL)
-
-    @staticmethod
-    def _process(time_slices):
-        slice_indices = [int(index) for index in time_slices.keys()]
-        offset = min(slice_indices)
-        all_slices = [0.0] * (max(slice_indices) - offset + 1)
-        all_time_series = {'user': all_slices, 'subreddit': all_slices.copy()}
-        for index, all_dists in time_slices.items():
-            for dist_name, dist in all_dists.items():
-                freqs = np.array(list(dist.values()))
-                if freqs.shape[0] == 1:
-                    norm_entropy = 0.0
-                else:
-                    total = np.sum(freqs)
-                    entropy = np.log2(total) - freqs.dot(np.log2(freqs)) / total
-                    norm_entropy = entropy / np.log2(freqs.shape[0])
-                all_time_series[dist_name][int(index) - offset] = norm_entropy
-        return all_time_series
+        time_series = compute_time_series(
+            dists, self.config.metrics, self.config.tsallis_q, self.count)
+        TimeSeriesStore.from_dict(time_series).save(output_file)
@@ -0,0 +1,499 @@
+from bisect import bisect_left
+from collections import defaultdict
+import pandas as pd
+import logging
+import pickle
+import os
+
+from utils.pathing import (
+    makepath,
+    ExperimentPaths,
+    EXPERIMENT_DIR,
+    RAW_DATA_DIR,
+    PREPROC_DATA_DIR,
+    COUNT_DATA_DIR,
+    USAGES_DATA_DIR,
+    EXIST_DATA_DIR,
+    CAP_DATA_DIR,
+    NEO_DATA_DIR,
+    DIST_DIR,
+    TIME_SERIES_DIR,
+    COUNT_FILE,
+    USAGE_DICT_FILE,
+    ID_MAP_FILE,
+    SURVIVING_FILE,
+    DYING_FILE,
+    EXISTING_FILE,
+    SURVIVING_STORE,
+    DYING_STORE,
+    EXISTING_STORE
+)
+from model.distributions import (
+    merge,
+    normalize,
+    denormalize,
+    _process_files
+)
+from model.entropy import compute_time_series, check_metrics, TSALLIS_Q
+from data.count import count_words
+from data.find import find_usages
+from data.detect import detect_words, aggregate_cap_freqs
+from utils.data_management import RowFileMapper, parts, save_usage_index
+from utils.timeline import TimelineConfig, Timeline
+from utils.ts_store import TimeSeriesStore
+from utils.config import CommandConfigBase
+
+
+class IncrementalUpdateConfig(CommandConfigBase):
+    def __init__(self, **kwargs):
+        """
+        Configs for the IncrementalUpdate class. Accepted kwargs are:
+
+        experiment_dir: (type: Path-like, default: utils.pathing.EXPERIMENT_DIR)
+            Directory (either relative to utils.pathing.EXPERIMENTS_ROOT_DIR or
+            absolute) representing the currently-running experiment.
+
+        raw_dir: (type: Path-like, default: utils.pathing.RAW_DATA_DIR)
+            Directory (either absolute or relative to 'experiment_dir') from
+            which to read the downloaded Reddit data of the new partition.
+
+        preproc_dir: (type: Path-like, default: utils.pathing.PREPROC_DATA_DIR)
+            Directory (either absolute or relative to 'experiment_dir') from
+            which to read the preprocessed Reddit data. Files not yet in
+            'map_file' form the new partition.
+
+        count_dir: (type: Path-like, default: utils.pathing.COUNT_DATA_DIR)
+            Directory (either absolute or relative to 'experiment_dir') in which
+            to update 'count_file'.
+
+        count_file: (type: str, default: utils.pathing.COUNT_FILE)
+            Path (relative to 'count_dir') of the user and subreddit count file.
+
+        usages_dir: (type: Path-like, default: utils.pathing.USAGES_DATA_DIR)
+            Directory (either absolute or relative to 'experiment_dir') in which
+            to update 'usage_file' and 'map_file'.
+
+        usage_file: (type: str, default: utils.pathing.USAGE_DICT_FILE)
+            Path (relative to 'usages_dir') of the usage dictionary file.
+
+        map_file: (type: str, default: utils.pathing.ID_MAP_FILE)
+            Path (relative to 'usages_dir') of the usage ID map file.
+
+        exist_data_dir: (type: Path-like, default: utils.pathing.EXIST_DATA_DIR)
+            Directory (either absolute or relative to 'experiment_dir') from
+            which to read the existing words sample auxiliary input file.
+
+        existing_aux_file: (type: str, default: utils.pathing.EXISTING_FILE)
+            Path (relative to 'exist_data_dir') of the randomly-sampled existing
+            words auxiliary input file.
+
+        cap_data_dir: (type: Path-like, default: utils.pathing.CAP_DATA_DIR)
+            Directory (either absolute or relative to 'experiment_dir') from
+            which to read the capitalization frequency auxiliary input files,
+            including those of the new partition.
+
+        min_usage_cutoff: (type: int, default: 1)
+            The minimum number of occurrences of a word to be considered valid.
+            Must match that of the 'basic-detect' stage. See
+            data.detect.BasicDetectorConfig for details.
+
+        max_usage_cutoff_existing: (type: int, default: 10,000)
+            The maximum number of occurrences of an EXISTING word to be
+            considered valid. Must match that of the 'basic-detect' stage.
+
+        neo_dir: (type: Path-like, default: utils.pathing.NEO_DATA_DIR)
+            Directory (either absolute or relative to 'experiment_dir') in which
+            to update all the new and existing words.
+
+        surviving_neo_file: (type: str, default: utils.pathing.SURVIVING_FILE)
+            Path (relative to 'neo_dir') to the detected surviving new words.
+
+        dying_neo_file: (type: str, default: utils.pathing.DYING_FILE)
+            Path (relative to 'neo_dir') to the detected dying new words file.
+
+        existing_neo_file: (type: str, default: utils.pathing.EXISTING_FILE)
+            Path (relative to 'neo_dir') to the randomly-sampled existing words
+            file.
+
+        dist_dir: (type: Path-like, default: utils.pathing.DIST_DIR)
+            Directory (either absolute or relative to 'experiment_dir') in which
+            to update the word frequency distributions.
+
+        surviving_dist_file: (type: str, default: utils.pathing.SURVIVING_FILE)
+            Path (relative to 'dist_dir') of the surviving new word
+            distributions file.
+
+        dying_dist_file: (type: str, default: utils.pathing.DYING_FILE)
+            Path (relative to 'dist_dir') of the dying new word distributions
+            file.
+
+        existing_dist_file: (type: str, default: utils.pathing.EXISTING_FILE)
+            Path (relative to 'dist_dir') of the existing word distributions
+            file.
+
+        time_series_dir: (type: Path-like, default:
+                utils.pathing.TIME_SERIES_DIR)
+            Directory (either absolute or relative to 'experiment_dir') in which
+            to update the entropy time series.
+
+        surviving_store: (type: str, default: utils.pathing.SURVIVING_STORE)
+            Path (relative to 'time_series_dir') of the surviving new word
+            entropy time series store.
+
+        dying_store: (type: str, default: utils.pathing.DYING_STORE)
+            Path (relative to 'time_series_dir') of the dying new word entropy
+            time series store.
+
+        existing_store: (type: str, default: utils.pathing.EXISTING_STORE)
+            Path (relative to 'time_series_dir') of the existing word entropy
+            time series store.
+
+        timeline_config: (type: dict, default: {})
+            Timeline configurations to use, with 'end' extended to cover the
+            new partition. All other parameters must match those used to
+            produce the existing outputs. See utils.timeline.TimelineConfig for
+            details.
+
+        metrics: (type: list[str], default: ["shannon"])
+            The entropy metrics to compute. Must match those of the stage that
+            produced the existing time series. See
+            model.time_series.TimeSeriesConfig for details.
+
+        tsallis_q: (type: float, default: model.entropy.TSALLIS_Q)
+            The entropic index of the 'tsallis' metric.
+
+        :param kwargs: optional configs to overwrite defaults (see above)
+        """
+        self.experiment_dir = kwargs.pop('experiment_dir', EXPERIMENT_DIR)
+        self.raw_dir = kwargs.pop('raw_dir', RAW_DATA_DIR)
+        self.preproc_dir = kwargs.pop('preproc_dir', PREPROC_DATA_DIR)
+        self.count_dir = kwargs.pop('count_dir', COUNT_DATA_DIR)
+        self.count_file = kwargs.pop('count_file', COUNT_FILE)
+        self.usages_dir = kwargs.pop('usages_dir', USAGES_DATA_DIR)
+        self.usage_file = kwargs.pop('usage_file', USAGE_DICT_FILE)
+        self.map_file = kwargs.pop('map_file', ID_MAP_FILE)
+        self.exist_data_dir = kwargs.pop('exist_data_dir', EXIST_DATA_DIR)
+        self.existing_aux_file = kwargs.pop('existing_aux_file', EXISTING_FILE)
+        self.cap_data_dir = kwargs.pop('cap_data_dir', CAP_DATA_DIR)
+        self.min_usage_cutoff = kwargs.pop('min_usage_cutoff', 1)
+        self.max_usage_cutoff_existing = kwargs.pop(
+            'max_usage_cutoff_existing', 10000)
+        self.neo_dir = kwargs.pop('neo_dir', NEO_DATA_DIR)
+        self.surviving_neo_file = kwargs.pop(
+            'surviving_neo_file', SURVIVING_FILE)
+        self.dying_neo_file = kwargs.pop('dying_neo_file', DYING_FILE)
+        self.existing_neo_file = kwargs.pop('existing_neo_file', EXISTING_FILE)
+        self.dist_dir = kwargs.pop('dist_dir', DIST_DIR)
+        self.surviving_dist_file = kwargs.pop(
+            'surviving_dist_file', SURVIVING_FILE)
+        self.dying_dist_file = kwargs.pop('dying_dist_file', DYING_FILE)
+        self.existing_dist_file = kwargs.pop(
+            'existing_dist_file', EXISTING_FILE)
+        self.time_series_dir = kwargs.pop('time_series_dir', TIME_SERIES_DIR)
+        self.surviving_store = kwargs.pop('surviving_store', SURVIVING_STORE)
+        self.dying_store = kwargs.pop('dying_store', DYING_STORE)
+        self.existing_store = kwargs.pop('existing_store', EXISTING_STORE)
+        self.timeline_config = kwargs.pop('timeline_config', {})
+        self.metrics = kwargs.pop('metrics', ["shannon"])
+        self.tsallis_q = kwargs.pop('tsallis_q', TSALLIS_Q)
+        super().__init__(**kwargs)
+
+        check_metrics(self.metrics, self.tsallis_q)
+
+    def make_paths_absolute(self):
+        paths = ExperimentPaths(
+            experiment_dir=self.experiment_dir,
+            raw_data_dir=self.raw_dir,
+            preproc_data_dir=self.preproc_dir,
+            count_data_dir=self.count_dir,
+            usages_data_dir=self.usages_dir,
+            exist_data_dir=self.exist_data_dir,
+            cap_data_dir=self.cap_data_dir,
+            neo_data_dir=self.neo_dir,
+            dist_dir=self.dist_dir,
+            time_series_dir=self.time_series_dir
+        )
+        self.experiment_dir = paths.experiment_dir
+        self.raw_dir = paths.raw_data_dir
+        self.preproc_dir = paths.preproc_data_dir
+        self.count_dir = paths.count_data_dir
+        self.count_file = makepath(self.count_dir, self.count_file)
+        self.usages_dir = paths.usages_data_dir
+        self.usage_file = makepath(self.usages_dir, self.usage_file)
+        self.map_file = makepath(self.usages_dir, self.map_file)
+        self.exist_data_dir = paths.exist_data_dir
+        self.existing_aux_file = makepath(
+            self.exist_data_dir, self.existing_aux_file)
+        self.cap_data_dir = paths.cap_data_dir
+        self.neo_dir = paths.neo_data_dir
+        self.surviving_neo_file = makepath(
+            self.neo_dir, self.surviving_neo_file)
+        self.dying_neo_file = makepath(self.neo_dir, self.dying_neo_file)
+        self.existing_neo_file = makepath(self.neo_dir, self.existing_neo_file)
+        self.dist_dir = paths.dist_dir
+        self.surviving_dist_file = makepath(
+            self.dist_dir, self.surviving_dist_file)
+        self.dying_dist_file = makepath(self.dist_dir, self.dying_dist_file)
+        self.existing_dist_file = makepath(
+            self.dist_dir, self.existing_dist_file)
+        self.time_series_dir = paths.time_series_dir
+        self.surviving_store = makepath(
+            self.time_series_dir, self.surviving_store)
+        self.dying_store = makepath(self.time_series_dir, self.dying_store)
+        self.existing_store = makepath(
+            self.time_series_dir, self.existing_store)
+        return self
+
+
+class IncrementalUpdate:
+    def __init__(self, config: IncrementalUpdateConfig):
+        """
+        Incrementally updates the outputs of the 'count', 'find',
+        'basic-detect', 'dists' and 'time-series' stages with a new partition
+        of (downloaded and preprocessed) Reddit data, so that they match a
+        full rerun of these stages.
+
+        The counts, usages, distributions and time series of all tracked words
+        (surviving, dying and existing) are extended with the new partition.
+        Words used in the new partition are detected again as the
+        'basic-detect' stage would, which starts tracking the newly-detected
+        ones (e.g., words first appearing in the new partition), and surviving
+        and dying words are re-split using the new late cutoff. The 'dists'
+        stage must not have been run in 'fused' mode, because the existing
+        distributions are needed.
+
+        Only the new partition of the corpus is read and scanned. However,
+        the update is not O(new data) overall:
+        - The existing output files (e.g., the usage dictionary and the
+          distributions) are still loaded and rewritten whole.
+        - Distributions are normalized by the corpus-wide word count of each
+          user and subreddit. So every time slice using a user or subreddit
+          with new data is renormalized and gets its entropies recomputed,
+          old time slices included. With a new partition for every
+          subreddit, that is most time slices. The others are left as is.
+
+        :param config: see IncrementalUpdateConfig for details
+        """
+        self.config = config
+        self.timeline = Timeline(TimelineConfig(**self.config.timeline_config))
+
+    def run(self) -> None:
+        config = self.config
+        mapper = RowFileMapper.load(config.map_file)
+        new_files = self._find_new_files(mapper)
+        if not new_files:
+            logging.info("No new files. Nothing to update.")
+            return
+        logging.info(f"Updating with {len(new_files)} new files.")
+
+        # Update counts.
+        with open(config.count_file, 'rb') as file:
+            old_count = pickle.load(file)
+        new_count = {'user': {}, 'subreddit': {}}
+        for file in new_files:
+            df = pd.read_csv(makepath(config.raw_dir, file))
+            count_words(df, parts(file)['subreddit_id'], new_count['user'],
+                        new_count['subreddit'])
+        count = {name: dict(old_count[name]) for name in old_count}
+        for name, counts in new_count.items():
+            for key, value in counts.items():
+                count[name][key] = count[name].get(key, 0) + value
+
+        # Update usages, remembering which rows are new.
+        with open(config.usage_file, 'rb') as file:
+            usage_dict = pickle.load(file)
+        self._resume(mapper)
+        first_new_id = mapper.id
+        for file in new_files:
+            mapper.new_file(file)
+            df = pd.read_csv(makepath(config.preproc_dir, file))
+            find_usages(df, mapper, usage_dict)
+
+        # Detect the words used in the new partition again.
+        neos = {}
+        for name in ['surviving', 'dying', 'existing']:
+            with open(getattr(config, f"{name}_neo_file"), 'rb') as file:
+                neos[name] = pickle.load(file)
+        changes = self._detect(neos, usage_dict, first_new_id)
+
+        # Update distributions and time series of each word category.
+        categories = {}
+        for name in ['surviving', 'dying', 'existing']:
+            added, removed = changes[name]
+            categories[name] = self._update_category(
+                name, neos[name], added, removed, usage_dict, mapper,
+                first_new_id, old_count, new_count, count)
+        self._resplit(categories)
+
+        # Save everything.
+        for name, (neo, dists, time_series) in categories.items():
+            self._save(neo, getattr(config, f"{name}_neo_file"))
+            save_usage_index(neo, getattr(config, f"{name}_neo_file"))
+            self._save(dists, getattr(config, f"{name}_dist_file"))
+            TimeSeriesStore.from_dict(time_series).save(
+                getattr(config, f"{name}_store"))
+        self._save(usage_dict, config.usage_file)
+        self._save(count, config.count_file)
+        mapper.save(config.map_file)
+
+    def _find_new_files(self, mapper):
+        known = set(mapper.id_map.values())
+        new_files = []
+        for root, _, files in os.walk(self.config.preproc_dir):
+            new_files.extend(file for file in files if file not in known)
+        return sorted(new_files)
+
+    def _resume(self, mapper):
+        # The mapper only saves the first row ID of each file, so the next row
+        # ID has to be recovered from the length of the last file.
+        last_id = max(mapper.id_map)
+        last_file = makepath(self.config.preproc_dir, mapper.id_map[last_id])
+        mapper.id = last_id + len(pd.read_csv(last_file))
+
+    def _detect(self, neos, usage_dict, first_new_id):
+        """
+        Runs basic detection on the words used in the new partition, which are
+        the only ones whose detection may have changed.
+
+        :return: for each category, the words to add (with their usages) and
+            the words to remove
+        """
+        config = self.config
+        used = {word: usage for word, usage in usage_dict.items()
+                if usage[2][-1] >= first_new_id}
+        with open(config.existing_aux_file, 'rb') as file:
+            existing_words = pickle.load(file)
+        surviving, dying, existing = detect_words(
+            used, self.timeline, aggregate_cap_freqs(config.cap_data_dir),
+            existing_words, config.min_usage_cutoff,
+            config.max_usage_cutoff_existing)
+
+        # Tracked surviving and dying words are re-split later on.
+        tracked = neos['surviving'].keys() | neos['dying'].keys()
+        detected = surviving.keys() | dying.keys()
+        changes = {}
+        for name, words in [('surviving', surviving), ('dying', dying)]:
+            added = {word: usage for word, usage in words.items()
+                     if word not in tracked}
+            removed = (neos[name].keys() & used.keys()) - detected
+            changes[name] = added, removed
+        added = {word: usage for word, usage in existing.items()
+                 if word not in neos['existing']}
+        removed = (neos['existing'].keys() & used.keys()) - existing.keys()
+        changes['existing'] = added, removed
+        for name, (added, removed) in changes.items():
+            for word in added:
+                logging.info(f"Word '{word}' is now {name}.")
+            for word in removed:
+                logging.info(f"Word '{word}' is no longer {name}.")
+        return changes
+
+    def _update_category(self, name, neo, added, removed, usage_dict, mapper,
+                         first_new_id, old_count, new_count, count):
+        config = self.config
+        with open(getattr(config, f"{name}_dist_file"), 'rb') as file:
+            dists = pickle.load(file)
+        store = TimeSeriesStore.load(getattr(config, f"{name}_store"), mmap=False)
+        time_series = store.to_dict()
+        for word in removed:
+            del neo[word]
+            dists.pop(word, None)
+            time_series.pop(word, None)
+
+        # Only the new rows in which the tracked words appear are processed,
+        # but all rows for the newly-tracked words.
+        file_row_map = defaultdict(lambda: defaultdict(list))
+        for word in list(neo) + list(added):
+            usage = neo[word] = usage_dict[word]
+            ids = usage[2]
+            first = 0 if word in added else bisect_left(ids, first_new_id)
+            for comment_id in ids[first:]:
+                file, row = mapper.reverse(comment_id)
+                file_row_map[file][row].append(word)
+        tasks = [(file, dict(row_map)) for file, row_map in file_row_map.items()]
+        new_dists, _ = _process_files(
+            config.preproc_dir, self.timeline, None, tasks)
+
+        # The new usages change the counts of their users and subreddits, and
+        # hence the normalization of every time slice using any of them, new
+        # or old. Only those time slices are renormalized from their raw
+        # counts and get their entropies recomputed; the others are unchanged
+        # from a full rerun.
+        # That includes every existing time slice with new usages.
+        stale = self._stale_slices(dists, new_count)
+        old_firsts = {word: min(dists[word]) for word in stale
+                      if word in dists}
+        denormalize(stale, old_count)
+        merge(stale, new_dists)
+        normalize(stale, count)
+        for word, stale_slices in stale.items():
+            dists.setdefault(word, {}).update(stale_slices)
+        self._update_time_series(time_series, dists, stale, old_firsts, count)
+        logging.info(f"{name}: updated {len(neo)} words, {len(new_dists)} "
+                     f"with new usages, {len(stale)} renormalized.")
+        return neo, dists, time_series
+
+    @staticmethod
+    def _stale_slices(dists, new_count):
+        """
+        Returns {word: {time_slice: all_dists}} of the time slices in 'dists'
+        normalized by any user or subreddit count that the new partition
+        changes.
+        """
+        users, subreddits = new_count['user'], new_count['subreddit']
+        stale = {}
+        for word, all_slices in dists.items():
+            for time_slice, all_dists in all_slices.items():
+                if (not users.keys().isdisjoint(all_dists['user'])
+                        or not subreddits.keys().isdisjoint(
+                            all_dists['subreddit'])):
+                    stale.setdefault(word, {})[time_slice] = all_dists
+        return stale
+
+    def _update_time_series(self, time_series, dists, stale, old_firsts,
+                            count):
+        """
+        Recomputes the entropies of the 'stale' time slices only, in place,
+        extending each word's time series to cover all of its time slices.
+
+        :param old_firsts: the first time slice of each word before the
+            update, at which its existing time series starts
+        """
+        config = self.config
+        entropies = compute_time_series(
+            stale, config.metrics, config.tsallis_q, count)
+        for word, all_entropies in entropies.items():
+            first, last = min(dists[word]), max(dists[word])
+            stale_first = min(stale[word])
+            old_first = old_firsts.get(word, first)
+            all_time_series = time_series.setdefault(word, {})
+            for dim, values in all_entropies.items():
+                old = all_time_series.get(dim, [])
+                ts = [0.0] * (last - first + 1)
+                ts[old_first - first:old_first - first + len(old)] = old
+                for time_slice in stale[word]:
+                    ts[time_slice - first] = values[time_slice - stale_first]
+                all_time_series[dim] = ts
+
+    def _resplit(self, categories):
+        surviving, dying = categories['surviving'], categories['dying']
+        words = list(surviving[0]) + list(dying[0])
+        sources = [surviving] * len(surviving[0]) + [dying] * len(dying[0])
+        lasts = [source[0][word][1] for word, source in zip(words, sources)]
+        new_surviving, new_dying = ({}, {}, {}), ({}, {}, {})
+        for word, source, is_late in zip(
+                words, sources, self.timeline.are_late(lasts)):
+            target = new_surviving if is_late else new_dying
+            if source is not (surviving if is_late else dying):
+                logging.info(f"Word '{word}' is now "
+                             f"{'surviving' if is_late else 'dying'}.")
+            for part, new_part in zip(source, target):
+                if word in part:
+                    new_part[word] = part[word]
+        categories['surviving'] = new_surviving
+        categories['dying'] = new_dying
+
+    @staticmethod
+    def _save(obj, filename):
+        with open(filename, 'wb') as file:
+            pickle.dump(obj, file, protocol=pickle.HIGHEST_PROTOCOL)
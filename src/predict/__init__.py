@@ -7,5 +7,11 @@ ALL_PREDICTORS = [
     SVM,
     LinearSVM,
     RandomForest,
+    HistGradientBoosting,
     MajorityClass
 ]
+
+# The predictors run by default. The others have to be selected explicitly.
+DEFAULT_PREDICTORS = [
+    pred for pred in ALL_PREDICTORS if pred is not HistGradientBoosting
+]
@@ -0,0 +1,74 @@
+import numpy as np
+
+from utils.ragged import expanding_spearman
+
+
+# The kinds of features that predictors can be trained on. See
+# predict.predict.PredictionConfig.
+FEATURE_KINDS = ('prefix', 'summary')
+
+# The summary features of each time series dimension, in order.
+SUMMARY_FEATURES = ('mean', 'last', 'slope', 'spearman', 'volatility')
+
+
+def summarize(values, lengths):
+    """
+    Computes fixed-length summary features of every prefix of every word's
+    time series at once, from cumulative sums. The summary at k of a word
+    covers its first k + 1 time slices, or all of them if it has fewer, so
+    words with short time series still get features at every k.
+
+    Each dimension gets, in order of SUMMARY_FEATURES: the mean, the last
+    value, the least-squares slope over the time index, Spearman's rho with
+    the time index, and the volatility (the standard deviation of the
+    slice-to-slice differences). Features undefined for a single time slice
+    (slope, rho, volatility) are 0.0. The number of time slices summarized is
+    deliberately left out: for dying words, whether a series has already ended
+    before k would give the label away, which the prefix features can't see.
+
+    :param values: the NaN-padded time series, (n_words, n_dims, n_slices)
+    :param lengths: the length of each word's time series, (n_words)
+    :return: the summaries, (n_words, n_slices, n_dims * 5)
+    """
+    values = np.asarray(values, dtype=float)
+    n_words, n_dims, n_slices = values.shape
+    lengths = np.asarray(lengths)
+    counts = np.minimum(lengths[:, None], np.arange(1, n_slices + 1))
+    in_series = np.arange(n_slices) < lengths[:, None, None]
+    x = np.where(in_series, np.nan_to_num(values), 0.0)
+
+    def at_count(cumulative, offset=1):
+        # The cumulative values over the first 'counts' (minus 'offset' + 1)
+        # time slices, (n_words, n_dims, n_slices).
+        index = np.maximum(counts - offset, 0)[:, None, :]
+        index = np.broadcast_to(index, cumulative.shape[:2] + index.shape[2:])
+        return np.take_along_axis(cumulative, index, axis=2)
+
+    c = np.maximum(counts, 1)[:, None, :].astype(float)  # Empty series: 0.0.
+    t = np.arange(n_slices)
+    mean = at_count(np.cumsum(x, axis=2)) / c
+    last = at_count(x)
+    # Least squares: slope = (sum(t x) - sum(t) mean) / (sum(t^2) - c mean_t^2)
+    sum_t = c * (c - 1) / 2
+    sum_tt = (c - 1) * c * (2 * c - 1) / 6
+    sum_tx = at_count(np.cumsum(t * x, axis=2))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = np.where(c > 1, (sum_tx - sum_t * mean)
+                         / (sum_tt - sum_t ** 2 / c), 0.0)
+    diffs = np.diff(x, axis=2)
+    if n_slices > 1:
+        n_diffs = np.maximum(c - 1, 1)
+        diff_mean = at_count(np.cumsum(diffs, axis=2), offset=2) / n_diffs
+        diff_sq = at_count(np.cumsum(diffs ** 2, axis=2), offset=2) / n_diffs
+        volatility = np.where(
+            c > 1, np.sqrt(np.maximum(diff_sq - diff_mean ** 2, 0.0)), 0.0)
+    else:
+        volatility = np.zeros_like(mean)
+    rho = np.zeros_like(mean)
+    for d in range(n_dims):
+        rhos, _ = expanding_spearman(values[:, d, :], lengths)
+        rhos = np.column_stack([np.zeros(n_words), rhos])  # [:, m - 1]
+        rho[:, d, :] = np.take_along_axis(rhos, np.maximum(counts - 1, 0),
+                                          axis=1)
+    summaries = np.stack([mean, last, slope, rho, volatility], axis=2)
+    return summaries.transpose(0, 3, 1, 2).reshape(n_words, n_slices, -1)
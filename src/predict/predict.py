@@ -1,14 +1,23 @@
 # (Optional) Figure out how to do prec, rec, f1, and acc for each one.
 # For each metric, make a num_predictors x k table to report the metric.
-#  In principle, would need cross validation for means/std, but oh well.
+#  For means/stds, cross-validate (see 'cv_folds' and 'cv_repeats').
 # See also:
 #  https://scikit-learn.org/stable/tutorial/basic/tutorial.html#learning-and-predicting
 #  https://machinelearningmastery.com/multinomial-logistic-regression-with-python/
 #  *** Esp this one: https://scikit-learn.org/stable/model_selection.html
 from sklearn.metrics import accuracy_score, balanced_accuracy_score
-from sklearn.model_selection import train_test_split
+from sklearn.model_selection import train_test_split, RepeatedKFold
+import sklearn
+from threadpoolctl import threadpool_limits
+from multiprocessing import Pool
+from functools import partial
 import pandas as pd
+import tempfile
 import pickle
+import zlib
+import copy
+import numpy as np
+import os
 
 from utils.pathing import (
     makepath,
@@ -16,13 +25,24 @@ from utils.pathing import (
     EXPERIMENT_DIR,
     TIME_SERIES_DIR,
     PREDICT_DIR,
-    SURVIVING_FILE,
-    DYING_FILE,
-    EXISTING_FILE
+    PREDICT_CACHE_DIR,
+    PREDICTOR_DIR,
+    PREDICTORS_FILE,
+    PREDICTORS_EXISTING_FILE,
+    SURVIVING_STORE,
+    DYING_STORE,
+    EXISTING_STORE
 )
 from utils.timeline import TimelineConfig, Timeline
+from utils.ts_store import TimeSeriesStore
 from utils.config import CommandConfigBase
-from . import ALL_PREDICTORS
+from utils.cache import ResultCache
+from . import ALL_PREDICTORS, DEFAULT_PREDICTORS, SEARCH_STRATEGIES
+from .features import FEATURE_KINDS, SUMMARY_FEATURES, summarize
+
+
+# The word type of each label.
+LABELS = ('surviving', 'dying', 'existing')
 
 
 class PredictionConfig(CommandConfigBase):
@@ -38,17 +58,17 @@ class PredictionConfig(CommandConfigBase):
             Directory (either absolute or relative to 'experiment_dir') from
             which to read the time series data.
 
-        surviving_file: (type: str, default: utils.pathing.SURVIVING_FILE)
+        surviving_file: (type: str, default: utils.pathing.SURVIVING_STORE)
             Path (relative to 'input_dir') of the surviving new word time series
-            file.
+            store (or legacy pickle file). See utils.ts_store.TimeSeriesStore.
 
-        dying_file: (type: str, default: utils.pathing.DYING_FILE)
+        dying_file: (type: str, default: utils.pathing.DYING_STORE)
             Path (relative to 'input_dir') of the dying new word time series
-            file.
+            store (or legacy pickle file). See utils.ts_store.TimeSeriesStore.
 
-        existing_file: (type: str, default: utils.pathing.EXISTING_FILE)
+        existing_file: (type: str, default: utils.pathing.EXISTING_STORE)
             Path (relative to 'input_dir') of the existing word time series
-            file.
+            store (or legacy pickle file). See utils.ts_store.TimeSeriesStore.
 
         output_dir: (type: Path-like, default: utils.pathing.PREDICT_DIR)
             Directory (either absolute or relative to 'experiment_dir') in which
@@ -58,22 +78,153 @@ class PredictionConfig(CommandConfigBase):
             Timeline configurations to use. Any given parameters override the
             defaults. See utils.timeline.TimelineConfig for details.
 
+        num_workers: (type: int, default: 1)
+            The number of worker processes among which to split the grid of
+            (k, predictor) fits. If 1, the fits run serially in the main
+            process, but each predictor's internal hyper-parameter search
+            runs on all cores. Otherwise, each worker is limited to a single
+            core, so that cores are not oversubscribed. Either way, the
+            results are deterministic given the seed.
+
+        search: (type: str, default: None)
+            The hyper-parameter search strategy of all predictors: 'none',
+            'random' or 'halving' (successive halving). If None, each
+            predictor uses its own default: a random search for the random
+            forest, and no search for the others. See
+            predict.predictors.Predictor.find_best() for details.
+
+        search_budget: (type: int, default: 10)
+            The number of hyper-parameter configurations that each search
+            samples.
+
+        search_cv: (type: int, default: 5)
+            The number of cross-validation folds that each search uses.
+
+        carry_over: (type: bool, default: False)
+            Whether each predictor sweeps k in order, starting each k from its
+            results at k - 1: searches are narrowed around the previous best
+            hyper-parameters with a third of the budget, and logistic models
+            are warm-started from the previous coefficients. Much cheaper
+            than independent searches, but each predictor's k are then fit
+            in sequence, so at most one worker per predictor is busy.
+
+        save_predictors: (type: bool, default: True)
+            Whether to save the fitted predictors of each k, for scoring new
+            words later (see predict.serve.Scorer). With cross-validation,
+            those of the first fold are saved.
+
+        predictor_dir: (type: Path-like, default: utils.pathing.PREDICTOR_DIR)
+            Directory (either absolute or relative to 'experiment_dir') in which
+            to save the fitted predictors.
+
+        predictors_file: (type: str, default: utils.pathing.PREDICTORS_FILE)
+            Path (relative to 'predictor_dir') of the saved predictors that
+            tell surviving from dying words.
+
+        predictors_existing_file: (type: str, default:
+                utils.pathing.PREDICTORS_EXISTING_FILE)
+            Path (relative to 'predictor_dir') of the saved predictors that
+            tell surviving, dying and existing words apart.
+
+        features: (type: str, default: 'prefix')
+            The features to predict from at each k. If 'prefix', each
+            dimension's first k + 1 time slices, so only words with at least
+            k + 1 time slices are used, and the number of features grows with
+            k. If 'summary', fixed-length summaries of each dimension's first
+            k + 1 time slices (or fewer, for shorter series), so all words
+            are used, with the same number of features at every k. See
+            predict.features.summarize() for details.
+
+        predictors: (type: list, default: None)
+            The class names of the predictors to run (e.g., ['RandomForest',
+            'HistGradientBoosting']), among predict.ALL_PREDICTORS. If None,
+            predict.DEFAULT_PREDICTORS, i.e., all but 'HistGradientBoosting'.
+
+        cv_folds: (type: int, default: 0)
+            If at least 2, the number of folds in which to split the words
+            of each type for repeated cross-validation, so that each fold
+            is stratified by word type. The tables then report the mean and
+            standard deviation of each score over all folds and repeats.
+            Otherwise, a single split holds out 10% of the words for testing.
+            Note that the number of fits is multiplied by 'cv_folds' *
+            'cv_repeats', but the folds are spread among the 'num_workers'
+            like everything else, so set 'num_workers' to the number of cores.
+
+        cv_repeats: (type: int, default: 1)
+            The number of times to repeat the cross-validation, each with a
+            different split into folds. Ignored unless 'cv_folds' is at least
+            2.
+
+        use_cache: (type: bool, default: False)
+            Whether to cache the extracted features and the fitted predictors
+            on disk (in 'cache_dir', which isn't versioned). Features are keyed
+            on the content of their input store and on the seed,
+            'timeline_config' and the feature and cross-validation configs.
+            Fitted predictors are also keyed on the predictor, its settings,
+            k, the fold and the scikit-learn version. All keys include
+            utils.cache.CACHE_VERSION. Reruns then only refit what changed
+            (e.g., nothing if only the tables changed).
+
+        cache_dir: (type: Path-like, default: utils.pathing.PREDICT_CACHE_DIR)
+            Directory (either absolute or relative to 'experiment_dir') in which
+            to cache features and fitted predictors.
+
+        cache_max_mb: (type: float, default: 1024)
+            Maximum total size of the cache, in MB. Least recently used
+            entries are evicted first.
+
+        cache_max_days: (type: float, default: 30)
+            Maximum number of days since a cached entry was last used before
+            it is evicted.
+
         :param kwargs: optional configs to overwrite defaults (see above)
         """
         self.experiment_dir = kwargs.pop('experiment_dir', EXPERIMENT_DIR)
         self.input_dir = kwargs.pop('input_dir', TIME_SERIES_DIR)
-        self.surviving_file = kwargs.pop('surviving_file', SURVIVING_FILE)
-        self.dying_file = kwargs.pop('dying_file', DYING_FILE)
-        self.existing_file = kwargs.pop('existing_file', EXISTING_FILE)
+        self.surviving_file = kwargs.pop('surviving_file', SURVIVING_STORE)
+        self.dying_file = kwargs.pop('dying_file', DYING_STORE)
+        self.existing_file = kwargs.pop('existing_file', EXISTING_STORE)
         self.output_dir = kwargs.pop('output_dir', PREDICT_DIR)
         self.timeline_config = kwargs.pop('timeline_config', {})
+        self.num_workers = kwargs.pop('num_workers', 1)
+        self.search = kwargs.pop('search', None)
+        self.search_budget = kwargs.pop('search_budget', 10)
+        self.search_cv = kwargs.pop('search_cv', 5)
+        self.carry_over = kwargs.pop('carry_over', False)
+        self.save_predictors = kwargs.pop('save_predictors', True)
+        self.predictor_dir = kwargs.pop('predictor_dir', PREDICTOR_DIR)
+        self.predictors_file = kwargs.pop('predictors_file', PREDICTORS_FILE)
+        self.predictors_existing_file = kwargs.pop(
+            'predictors_existing_file', PREDICTORS_EXISTING_FILE)
+        self.features = kwargs.pop('features', 'prefix')
+        self.predictors = kwargs.pop('predictors', None)
+        self.cv_folds = kwargs.pop('cv_folds', 0)
+        self.cv_repeats = kwargs.pop('cv_repeats', 1)
+        self.use_cache = kwargs.pop('use_cache', False)
+        self.cache_dir = kwargs.pop('cache_dir', PREDICT_CACHE_DIR)
+        self.cache_max_mb = kwargs.pop('cache_max_mb', 1024)
+        self.cache_max_days = kwargs.pop('cache_max_days', 30)
         super().__init__(**kwargs)
 
+        if self.num_workers < 1:
+            raise ValueError("'num_workers' must be positive")
+        if self.search is not None and self.search not in SEARCH_STRATEGIES:
+            raise ValueError(f"'search' must be one of {SEARCH_STRATEGIES}")
+        if self.features not in FEATURE_KINDS:
+            raise ValueError(f"'features' must be one of {FEATURE_KINDS}")
+        names = [pred.__name__ for pred in ALL_PREDICTORS]
+        if self.predictors is not None and set(self.predictors) - set(names):
+            raise ValueError(f"'predictors' must be among {names}")
+        if self.cv_repeats < 1:
+            raise ValueError("'cv_repeats' must be positive")
+
     def make_paths_absolute(self):
         paths = ExperimentPaths(
             experiment_dir=self.experiment_dir,
             time_series_dir=self.input_dir,
-            predict_dir=self.output_dir
+            predict_dir=self.output_dir,
+            predict_cache_dir=self.cache_dir,
+            predictor_dir=self.predictor_dir
         )
         self.experiment_dir = paths.experiment_dir
         self.input_dir = paths.time_series_dir
@@ -81,6 +232,12 @@ class PredictionConfig(CommandConfigBase):
         self.dying_file = makepath(self.input_dir, self.dying_file)
         self.existing_file = makepath(self.input_dir, self.existing_file)
         self.output_dir = paths.predict_dir
+        self.cache_dir = paths.predict_cache_dir
+        self.predictor_dir = paths.predictor_dir
+        self.predictors_file = makepath(self.predictor_dir,
+                                        self.predictors_file)
+        self.predictors_existing_file = makepath(
+            self.predictor_dir, self.predictors_existing_file)
         return self
 
 
@@ -98,83 +255,226 @@ class Prediction:
         self.max_time_slice = Timeline(tl_config).slice_of(tl_config.end)
         self.max_time_slice -= tl_config.early
         self.slice_size = tl_config.slice_size
+        self.num_k = int(self.max_time_slice * 0.75)
         self.metrics = {'Acc': accuracy_score, 'Bal': balanced_accuracy_score}
-        self.predictors = [pred(self.seed) for pred in ALL_PREDICTORS]
+        self.cache = None
+        if config.use_cache:
+            self.cache = ResultCache(config.cache_dir,
+                                     max_size=config.cache_max_mb * 2 ** 20,
+                                     max_age=config.cache_max_days * 86400)
 
     def run(self) -> None:
         surviving = self._extract(0, self.config.surviving_file)
         dying = self._extract(1, self.config.dying_file)
         existing = self._extract(2, self.config.existing_file)
-        self._do_run(surviving, dying)
-        self._do_run(surviving, dying, existing=existing)
+        self._do_run([surviving, dying])
+        self._do_run([surviving, dying, existing])
+
+    def _make_predictors(self):
+        """
+        Makes a fresh instance of every selected predictor, as predictors can
+        carry state from one fit to the next (see 'carry_over').
+        """
+        n_jobs = os.cpu_count() if self.config.num_workers == 1 else 1
+        names = self.config.predictors
+        if names is None:
+            names = [pred.__name__ for pred in DEFAULT_PREDICTORS]
+        return [pred(self._seed_of(pred), n_jobs,
+                     search=self.config.search,
+                     budget=self.config.search_budget,
+                     cv=self.config.search_cv,
+                     carry_over=self.config.carry_over)
+                for pred in ALL_PREDICTORS if pred.__name__ in names]
+
+    def _seed_of(self, predictor):
+        """
+        Derives the private seed of the 'predictor' class from its name, so
+        that predictors don't share random streams, whichever worker fits
+        them, and adding predictors doesn't change the others' seeds.
+        """
+        name = zlib.crc32(predictor.__name__.encode())
+        seq = np.random.SeedSequence([self.seed, name])
+        return int(seq.generate_state(1)[0])
 
-    def _do_run(self, surviving, dying, existing=None):
-        scores = self._score(surviving, dying, existing)
+    def _do_run(self, categories):
+        scores, fitted = self._score(categories)
         cols = [(f"Time Index ({self.slice_size}s since first appearance)",
-                 str(i)) for i in range(len(surviving))]
+                 str(k)) for k in range(self.num_k)]
         cols = pd.MultiIndex.from_tuples(cols)
+        has_existing = len(categories) > 2
         for metric_name, metric_scores in scores.items():
-            self._table(metric_name, metric_scores, cols, existing is not None)
+            self._table(metric_name, metric_scores, cols, has_existing)
+        if self.config.save_predictors:
+            self._save(categories, fitted, has_existing)
+
+    def _save(self, categories, fitted, has_existing):
+        """
+        Saves the fitted predictors of each k, with what's needed to build
+        their features. See predict.serve.Scorer for loading them.
+        """
+        path = self.config.predictors_file
+        if has_existing:
+            path = self.config.predictors_existing_file
+        with open(path, 'wb') as file:
+            pickle.dump({
+                'features': self.config.features,
+                'dims': categories[0]['dims'],
+                'labels': [LABELS[c['label']] for c in categories],
+                'predictors': fitted
+            }, file, protocol=pickle.HIGHEST_PROTOCOL)
 
     def _extract(self, label, input_path):
-        with open(input_path, 'rb') as file:
-            all_time_series_by_word = pickle.load(file)
-        train_keys, test_keys = train_test_split(
-            list(all_time_series_by_word.keys()),
-            test_size=0.1,
-            random_state=self.seed
-        )
-        X_and_y_by_k = []
-        for k in range(int(self.max_time_slice * 0.75)):
-            X_train = self._do_extract(train_keys, k, all_time_series_by_word)
-            X_test = self._do_extract(test_keys, k, all_time_series_by_word)
-            X_and_y_by_k.append({'X_train': X_train, 'X_test': X_test,
-                                 'y_train': [label] * len(X_train),
-                                 'y_test': [label] * len(X_test)})
-        return X_and_y_by_k
+        """
+        Builds the features of one category of words once, for all k.
+
+        :return: {'features': (n_words, n_dims, num_k) array of each word's
+            time series, or (n_words, num_k, n_features) summaries of them,
+            'lengths': (n_words) time series lengths, 'label',
+            'summary': whether the features are summaries,
+            'folds': [{'train'/'test': the word indices of each split} for
+            each fold], 'hash': the content hash of the input store, or None
+            if not caching}
+        """
+        compute = partial(self._do_extract, label, input_path)
+        if self.cache is None:
+            return dict(compute(), hash=None)
+        input_hash = ResultCache.hash_files(input_path)
+        key = self.cache.key(input_hash, 'predict-features', label,
+                             self.seed, self.num_k, *self._feature_settings(),
+                             *self._cv_settings())
+        return dict(self.cache.get_or_compute(key, compute), hash=input_hash)
+
+    def _do_extract(self, label, input_path):
+        store = TimeSeriesStore.load(input_path)
+        features = np.asarray(store.values[:, :self.num_k], dtype=float)
+        features = features.transpose(0, 2, 1)
+        summary = self.config.features == 'summary'
+        if summary:
+            features = summarize(features, store.lengths)
+        words = np.arange(len(store))
+        if self.config.cv_folds >= 2:
+            # The same splitter for every word type stratifies the folds.
+            splits = RepeatedKFold(
+                n_splits=self.config.cv_folds,
+                n_repeats=self.config.cv_repeats,
+                random_state=self.seed
+            ).split(words)
+        else:
+            splits = [train_test_split(
+                words,
+                test_size=0.1,
+                random_state=self.seed
+            )]
+        return {'features': features, 'summary': summary,
+                'lengths': store.lengths, 'label': label, 'dims': store.dims,
+                'folds': [{'train': train, 'test': test}
+                          for train, test in splits]}
+
+    def _feature_settings(self):
+        if self.config.features == 'summary':
+            return self.config.features, SUMMARY_FEATURES
+        return self.config.features, None
+
+    def _cv_settings(self):
+        if self.config.cv_folds >= 2:
+            return self.config.cv_folds, self.config.cv_repeats
+        return None, None
 
     @staticmethod
-    def _do_extract(X_keys, k, all_time_series_by_word):
-        X = []
-        for key in X_keys:
-            features = []
-            for time_series in all_time_series_by_word[key].values():
-                if len(time_series) <= k:  # This is NOT off-by-one.
-                    features = None
-                    break
-                features.extend(time_series[:k + 1])
-            if features is not None:
-                X.append(features)
-        return X
-
-    def _score(self, surviving, dying, existing=None):
-        scores = {}
-        if existing is None:
-            existing = [{'X_train': [], 'X_test': [],
-                         'y_train': [], 'y_test': []} for _ in surviving]
-        for s, d, e in zip(surviving, dying, existing):
-            X_train = s['X_train'] + d['X_train'] + e['X_train']
-            X_test = s['X_test'] + d['X_test'] + e['X_test']
-            y_train = s['y_train'] + d['y_train'] + e['y_train']
-            y_test = s['y_test'] + d['y_test'] + e['y_test']
-            for predictor in self.predictors:
-                predictor.find_best(X_train, y_train)
-                y_pred = predictor.predict(X_test)
-                for name, metric in self.metrics.items():
-                    score = metric(y_test, y_pred)
+    def _slice(category, fold, split, k):
+        """
+        Returns the features and labels at k of the words of the given split
+        of the given fold. Prefix features are each dimension's first k + 1
+        time slices, one dimension after another, so words whose time series
+        are too short are left out.
+        """
+        words = category['folds'][fold][split]
+        if category['summary']:
+            X = category['features'][words, k]
+            return X, np.full(len(words), category['label'])
+        words = words[category['lengths'][words] > k]  # NOT off-by-one.
+        n_features = category['features'].shape[1] * (k + 1)
+        X = category['features'][words, :, :k + 1].reshape(-1, n_features)
+        return X, np.full(len(words), category['label'])
+
+    def _score(self, categories):
+        """
+        Fits and scores every predictor for every k and fold.
+
+        :return: ({metric name: {predictor name: (n_folds, num_k) scores}},
+            {predictor class name: [predictor fitted on the first fold, for
+            each k]}), the latter empty if not saving predictors
+        """
+        n_folds = len(categories[0]['folds'])
+        if self.config.carry_over:
+            tasks = [(predictor, range(self.num_k), fold)
+                     for fold in range(n_folds)
+                     for predictor in self._make_predictors()]
+        else:
+            predictors = self._make_predictors()
+            tasks = [(predictor, [k], fold) for fold in range(n_folds)
+                     for k in range(self.num_k) for predictor in predictors]
+        key_prefix = (tuple(c['hash'] for c in categories), self.seed,
+                      *self._feature_settings(), *self._cv_settings())
+        if self.config.num_workers == 1:
+            _init_worker(categories, self.metrics, self.cache, key_prefix,
+                         self.config.save_predictors, limit_threads=False)
+            results = [_evaluate(task) for task in tasks]
+            _worker_data.clear()
+        else:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                init_args = (self._share(categories, tmp_dir), self.metrics,
+                             self.cache, key_prefix,
+                             self.config.save_predictors)
+                with Pool(self.config.num_workers, initializer=_init_worker,
+                          initargs=init_args) as pool:
+                    results = pool.map(_evaluate, tasks)
+        scores, fitted = {}, {}
+        for (predictor, ks, fold), task_results in zip(tasks, results):
+            for k, (result, fitted_predictor) in zip(ks, task_results):
+                if fitted_predictor is not None:
+                    fitted.setdefault(type(predictor).__name__,
+                                      [None] * self.num_k)[k] = fitted_predictor
+                for name, score in result.items():
                     data = scores.setdefault(name, {})
-                    data.setdefault(predictor.name, []).append(score)
-        return scores
+                    data.setdefault(predictor.name,
+                                    np.empty((n_folds, self.num_k)))
+                    data[predictor.name][fold, k] = score
+        return scores, fitted
+
+    @staticmethod
+    def _share(categories, tmp_dir):
+        """
+        Saves the feature arrays in 'tmp_dir' and replaces them with their
+        paths, so that workers memory-map the same read-only arrays instead
+        of each unpickling its own copy.
+        """
+        shared = []
+        for i, category in enumerate(categories):
+            path = makepath(tmp_dir, f"features-{i}.npy")
+            np.save(path, category['features'])
+            shared.append(dict(category, features=path))
+        return shared
 
     def _table(self, metric_name, metric_scores, cols, has_existing):
         filename = f"{metric_name}{'-Existing' if has_existing else ''}.txt"
-        df = pd.DataFrame.from_dict(metric_scores, orient='index', columns=cols)
+        means = pd.DataFrame.from_dict(
+            {name: scores.mean(axis=0) for name, scores in
+             metric_scores.items()}, orient='index', columns=cols)
+        df = means
+        if len(next(iter(metric_scores.values()))) > 1:
+            stds = pd.DataFrame.from_dict(
+                {name: scores.std(axis=0) for name, scores in
+                 metric_scores.items()}, orient='index', columns=cols)
+            df = (means.applymap("{:.2f}".format) + r" $\pm$ "
+                  + stds.applymap("{:.2f}".format))
+        is_max = means == means.max()
         df.style.format(precision=2).applymap_index(
             lambda v: "textbf:--rwrap;", axis=1
         ).applymap_index(
             lambda v: "textbf:--rwrap;"
         ).apply(
-            lambda s: ["textbf:--rwrap;" if c else '' for c in s == s.max()]
+            lambda s: ["textbf:--rwrap;" if c else '' for c in is_max[s.name]]
         ).to_latex(
             buf=makepath(self.config.output_dir, filename),
             column_format="l|" + "c" * len(cols),
@@ -183,3 +483,60 @@ class Prediction:
             hrules=True,
             multicol_align="c"
         )
+
+
+_worker_data = {}
+
+
+def _init_worker(categories, metrics, cache, key_prefix, keep_fitted,
+                 limit_threads=True):
+    for category in categories:
+        if isinstance(category['features'], str):  # See Prediction._share().
+            category['features'] = np.load(category['features'], mmap_mode='r')
+    _worker_data['categories'] = categories
+    _worker_data['metrics'] = metrics
+    _worker_data['cache'] = cache
+    _worker_data['key_prefix'] = key_prefix
+    _worker_data['keep_fitted'] = keep_fitted
+    if limit_threads:
+        threadpool_limits(limits=1)
+
+
+def _evaluate(task):
+    """
+    Fits one predictor for each of some k, in order, on one fold of the
+    worker's data and scores it. Fitted predictors are reused from the cache,
+    if any, where the inputs and settings match.
+
+    :param task: a (predictor, sequence of k, fold) tuple
+    :return: [({metric name: score}, a copy of the fitted predictor if
+        keeping those of the first fold, otherwise None) for each k]
+    """
+    predictor, ks, fold = task
+    categories = _worker_data['categories']
+    cache = _worker_data['cache']
+    results = []
+    for k in ks:
+        X_train, y_train = zip(*(Prediction._slice(c, fold, 'train', k)
+                                 for c in categories))
+        X_test, y_test = zip(*(Prediction._slice(c, fold, 'test', k)
+                               for c in categories))
+        fitted = key = None
+        if cache is not None:
+            key = cache.key(*_worker_data['key_prefix'], 'predict-model',
+                            sklearn.__version__, predictor.settings, k, fold)
+            fitted = cache.get(key)
+        if fitted is None:
+            predictor.find_best(np.concatenate(X_train),
+                                np.concatenate(y_train))
+            if cache is not None:
+                cache.put(key, predictor)
+        else:
+            predictor = fitted  # Carries its state over to the next k too.
+        y_pred = predictor.predict(np.concatenate(X_test))
+        y_test = np.concatenate(y_test)
+        scores = {name: metric(y_test, y_pred)
+                  for name, metric in _worker_data['metrics'].items()}
+        keep = _worker_data['keep_fitted'] and fold == 0
+        results.append((scores, copy.deepcopy(predictor) if keep else None))
+    return results
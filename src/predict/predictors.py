@@ -1,29 +1,189 @@
-from sklearn.model_selection import RandomizedSearchCV
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.model_selection import RandomizedSearchCV, HalvingRandomSearchCV
 from sklearn.linear_model import LogisticRegression
-from sklearn.ensemble import RandomForestClassifier
+from sklearn.ensemble import (
+    RandomForestClassifier,
+    HistGradientBoostingClassifier
+)
+from sklearn.utils.class_weight import compute_sample_weight
 from sklearn.dummy import DummyClassifier
 from sklearn.svm import SVC, LinearSVC
-from scipy.stats import geom
+from scipy.stats import geom, loguniform, rv_discrete
+import numpy as np
+
+
+SEARCH_STRATEGIES = ('none', 'random', 'halving')
+HALVING_FACTOR = 3
+# How far a carried-over search may stray from the previous best values:
+# continuous values by this factor, integer values by this many steps.
+NARROW_FACTOR = 3
+NARROW_STEPS = 2
 
 
 class Predictor:
-    def __init__(self, random_state):
+    # The strategy used when none is given. See find_best().
+    default_search = 'none'
+
+    def __init__(self, random_state, n_jobs=1, search=None, budget=10, cv=5,
+                 carry_over=False):
+        """
+        :param random_state: the seed of this predictor's private RNG
+        :param n_jobs: the number of parallel jobs that any internal
+            hyper-parameter search may use
+        :param search: the hyper-parameter search strategy, one of
+            SEARCH_STRATEGIES, or None for this predictor's default. See
+            find_best() for details.
+        :param budget: the number of hyper-parameter configurations that a
+            search samples from this predictor's param_space
+        :param cv: the number of cross-validation folds used by a search
+        :param carry_over: whether each call to find_best() starts from the
+            previous call's results, for fitting the same kind of data
+            (e.g., with one more time slice), as follows.
+            Searches narrow the param_space around the previous best
+            hyper-parameters and sample only a third of the budget. Models
+            that support it are warm-started from the previous model.
+        """
+        if search is not None and search not in SEARCH_STRATEGIES:
+            raise ValueError(f"Unknown search strategy: {search}")
         self._best = None
         self._rng = random_state
+        self._n_jobs = n_jobs
+        self._search = search or self.default_search
+        self._budget = budget
+        self._cv = cv
+        self._carry_over = carry_over
+        self._best_params = None
 
     @property
     def name(self): raise NotImplementedError
 
+    @property
+    def settings(self):
+        """
+        Everything that determines the models this predictor fits (given the
+        same data), e.g., for cache keys.
+        """
+        return (type(self).__name__, self._rng, self._search, self._budget,
+                self._cv, self._carry_over)
+
+    @property
+    def param_space(self):
+        """
+        The hyper-parameter distributions (or lists of values) to search, as
+        accepted by sklearn's RandomizedSearchCV. Empty if there's nothing to
+        tune, in which case find_best() never searches.
+        """
+        return {}
+
+    def make_model(self):
+        """
+        :return: a new, unfitted model with sensible hyper-parameter defaults
+        """
+        raise NotImplementedError
+
+    def fit_params(self, y):
+        """
+        :return: any extra kwargs to pass to the model's fit() for training
+            labels 'y' (e.g., sample weights)
+        """
+        return {}
+
     def find_best(self, X, y):
         """
-        Finding the best model could involve anything from trying out a single
-        version model with sensible hyper-parameter defaults all the way to
-        extensive hyper-parameter sweeps with Bayesian optimization.
+        Finds the best model according to the search strategy:
+
+        'none': fits a single model with sensible hyper-parameter defaults.
+        'random': cross-validates 'budget' configurations sampled from the
+            param_space, all on the full training set, and refits the best.
+        'halving': samples 'budget' configurations, cross-validates them on
+            a subset of the training set, and keeps only the best third for
+            the next round on three times the samples, until the last round
+            uses all of them. This spends the tuning effort on the
+            promising configurations. Then refits the best.
 
         :param X: training data, (n_samples, n_features)
         :param y: training labels, (n_samples)
         """
-        raise NotImplementedError
+        model = self.make_model()
+        fit_params = self.fit_params(y)
+        space, budget = self.param_space, self._budget
+        if self._carry_over and self._best_params is not None:
+            model.set_params(**self._best_params)
+            space = self._narrow(space, self._best_params)
+            budget = max(1, budget // 3)
+        if self._search == 'none' or not space:
+            if self._carry_over and self._best is not None:
+                self.warm_start(model, self._best, X, y)
+            self._best = model.fit(X, y, **fit_params)
+            return
+        if self._search == 'random':
+            self._best = RandomizedSearchCV(
+                model, space,
+                n_iter=budget,
+                cv=self._cv,
+                n_jobs=self._n_jobs,
+                random_state=self._rng
+            ).fit(X, y, **fit_params)
+        else:
+            self._best = HalvingRandomSearchCV(
+                model, space,
+                n_candidates=budget,
+                factor=HALVING_FACTOR,
+                min_resources=self._min_resources(y, budget),
+                cv=self._cv,
+                n_jobs=self._n_jobs,
+                random_state=self._rng
+            ).fit(X, y, **fit_params)
+        self._best_params = self._best.best_params_
+
+    def warm_start(self, model, previous, X, y):
+        """
+        Initializes 'model' from the 'previous' fitted model before it is fit
+        on X and y, if the model supports it. No-op by default.
+        """
+
+    @staticmethod
+    def _narrow(space, params):
+        """
+        Narrows each distribution (or list of values) in 'space' to values
+        near those in 'params'.
+        """
+        narrowed = {}
+        for name, dist in space.items():
+            value = params[name]
+            if isinstance(dist, list):
+                narrowed[name] = [v for v in dist if v == value or (
+                    value is not None and v is not None
+                    and abs(v - value) <= NARROW_STEPS)]
+            elif isinstance(dist.dist, rv_discrete):
+                low = max(int(dist.support()[0]), value - NARROW_STEPS)
+                narrowed[name] = list(range(low, value + NARROW_STEPS + 1))
+            else:
+                narrowed[name] = loguniform(value / NARROW_FACTOR,
+                                            value * NARROW_FACTOR)
+        return narrowed
+
+    def _min_resources(self, y, budget):
+        """
+        The number of samples in the first round of successive halving. That
+        is normally the smallest number that still lets the last round use
+        all of them. However, the rounds subsample without stratification,
+        so the first round is grown until it likely has a couple of samples
+        of even the rarest class in every fold. Otherwise (e.g., with few
+        dying words), whole rounds of fits fail for lack of a class. It is
+        grown by whole factors, dropping the first rounds, so that the last
+        round still uses all samples (in a single round, if need be).
+        """
+        n_rounds = 1 + int(np.log(budget) / np.log(HALVING_FACTOR))
+        exhaust = len(y) // HALVING_FACTOR ** (n_rounds - 1)
+        _, counts = np.unique(y, return_counts=True)
+        stratified = int(np.ceil(len(y) * 2 * self._cv / counts.min()))
+        if stratified <= exhaust:
+            return exhaust
+        n_rounds = 1
+        while len(y) // HALVING_FACTOR ** n_rounds >= stratified:
+            n_rounds += 1
+        return len(y) // HALVING_FACTOR ** (n_rounds - 1)
 
     def predict(self, X):
         """
@@ -34,75 +194,173 @@ class Predictor:
         """
         return self._best.predict(X)
 
+    def predict_proba(self, X):
+        """
+        Use the best model to predict class probabilities for a test set. For
+        models without probability estimates (e.g., SVMs), the predicted class
+        gets probability 1.
+
+        :param X: test data, (n_samples, n_features)
+        :return: predicted probabilities, (n_samples, n_classes), with columns
+            in the order of the 'classes' property
+        """
+        if hasattr(self._best, 'predict_proba'):
+            return self._best.predict_proba(X)
+        y_pred = self._best.predict(X)
+        return (y_pred[:, None] == self.classes[None, :]).astype(float)
+
+    @property
+    def classes(self):
+        """
+        The class labels seen while fitting the best model, in order.
+        """
+        return self._best.classes_
+
 
 class OVRLogisticRegression(Predictor):
     @property
     def name(self): return r"Log$_{\text{OVR}}$"
 
-    def find_best(self, X, y):
-        self._best = LogisticRegression(
+    @property
+    def param_space(self): return {"C": loguniform(1e-3, 1e3)}
+
+    def make_model(self):
+        return LogisticRegression(
             class_weight='balanced',
             multi_class='ovr',
             random_state=self._rng
-        ).fit(X, y)
+        )
+
+    def warm_start(self, model, previous, X, y):
+        _warm_start_linear(model, previous, X, y)
 
 
 class MultinomialLogisticRegression(Predictor):
     @property
     def name(self): return r"Log$_{\text{Multi}}$"
 
-    def find_best(self, X, y):
-        self._best = LogisticRegression(
+    @property
+    def param_space(self): return {"C": loguniform(1e-3, 1e3)}
+
+    def make_model(self):
+        return LogisticRegression(
             class_weight='balanced',
             multi_class='multinomial',
             random_state=self._rng
-        ).fit(X, y)
+        )
+
+    def warm_start(self, model, previous, X, y):
+        _warm_start_linear(model, previous, X, y)
 
 
 class SVM(Predictor):
     @property
     def name(self): return r"SVM$_{\text{RBF}}$"
 
-    def find_best(self, X, y):
+    @property
+    def param_space(self):
+        return {"C": loguniform(1e-2, 1e3), "gamma": loguniform(1e-4, 1e1)}
+
+    def make_model(self):
         #  https://scikit-learn.org/stable/modules/generated/sklearn.multiclass.OneVsRestClassifier.html
-        self._best = SVC(
+        return SVC(
             class_weight='balanced',
             random_state=self._rng
-        ).fit(X, y)
+        )
 
 
 class LinearSVM(Predictor):
     @property
     def name(self): return r"SVM$_{\text{Lin}}$"
 
-    def find_best(self, X, y):
+    @property
+    def param_space(self): return {"C": loguniform(1e-3, 1e3)}
+
+    def make_model(self):
         #  https://scikit-learn.org/stable/modules/generated/sklearn.multiclass.OneVsRestClassifier.html
-        self._best = LinearSVC(
+        return LinearSVC(
             dual=False,
             class_weight='balanced',
             random_state=self._rng
-        ).fit(X, y)
+        )
 
 
 class RandomForest(Predictor):
+    default_search = 'random'
+
     @property
     def name(self): return "RF"
 
-    def find_best(self, X, y):
-        param_dists = {
+    @property
+    def param_space(self):
+        return {
             "max_depth": [None] + list(range(1, 21)),
             "min_samples_split": geom(0.25, loc=1),
             "min_samples_leaf": geom(0.5, loc=1)
         }
-        self._best = RandomizedSearchCV(RandomForestClassifier(
+
+    def make_model(self):
+        return RandomForestClassifier(
             class_weight='balanced',
             random_state=self._rng
-        ), param_dists).fit(X, y)
+        )
+
+
+class HistGradientBoosting(Predictor):
+    @property
+    def name(self): return "HGB"
+
+    @property
+    def param_space(self):
+        return {
+            "learning_rate": loguniform(1e-2, 1),
+            "max_leaf_nodes": list(range(4, 64)),
+            "min_samples_leaf": list(range(2, 41)),
+            "l2_regularization": loguniform(1e-4, 10)
+        }
+
+    def make_model(self):
+        # Features are binned once, so training is near-linear in the number
+        # of samples. Stops once 10% held-out data stops improving.
+        return HistGradientBoostingClassifier(
+            early_stopping=True,
+            validation_fraction=0.1,
+            n_iter_no_change=10,
+            random_state=self._rng
+        )
+
+    def fit_params(self, y):
+        # Our sklearn's HistGradientBoostingClassifier has no 'class_weight'.
+        return {'sample_weight': compute_sample_weight('balanced', y)}
 
 
 class MajorityClass(Predictor):
     @property
     def name(self): return "Majority"
 
-    def find_best(self, X, y):
-        self._best = DummyClassifier(random_state=self._rng).fit(X, y)
+    def make_model(self):
+        return DummyClassifier(random_state=self._rng)
+
+
+def _warm_start_linear(model, previous, X, y):
+    """
+    Warm-starts a linear 'model' from the coefficients of the 'previous'
+    one, before fitting it on X and y. If X has more features, they are
+    assumed to be per-dimension time series prefixes, one dimension after
+    another (see predict.Prediction), so the previous coefficients are
+    spread over the longer prefixes and the new time slices start from zero.
+    Skipped if the shapes don't line up (e.g., when a class is missing from
+    one of the training sets).
+    """
+    coef = previous.coef_
+    if not np.array_equal(previous.classes_, np.unique(y)):
+        return
+    n_dims = X.shape[1] - coef.shape[1]
+    if n_dims > 0 and coef.shape[1] % n_dims == 0:
+        coef = coef.reshape(len(coef), n_dims, -1)
+        coef = np.pad(coef, ((0, 0), (0, 0), (0, 1)))
+    elif n_dims != 0:
+        return
+    model.set_params(warm_start=True)
+    model.coef_ = coef.reshape(len(coef), -1)
+    model.intercept_ = previous.intercept_.copy()
@@ -0,0 +1,201 @@
+import numpy as np
+import pickle
+import json
+import sys
+
+from utils.pathing import (
+    makepath,
+    ExperimentPaths,
+    EXPERIMENT_DIR,
+    PREDICTOR_DIR,
+    PREDICTORS_EXISTING_FILE
+)
+from utils.config import CommandConfigBase
+from .features import summarize
+
+
+class Scorer:
+    def __init__(self, predictors_path, predictor='RandomForest'):
+        """
+        Scores the word type of new words from the entropy time series seen so
+        far, with the predictors saved by the 'predict' stage. Each word is
+        scored by the predictor of the longest horizon k its series cover.
+
+        Use pattern:
+
+        scorer = Scorer('predictors-existing.pickle', predictor='RandomForest')
+        probs = scorer.score([
+            {'user': [0.1, 0.4, 0.5], 'subreddit': [0.2, 0.2, 0.3]},
+            {'user': [0.9], 'subreddit': [0.7]}
+        ])  # (2, len(scorer.labels)), one row of probabilities per word.
+
+        :param predictors_path: path of the predictors saved by the 'predict'
+            stage (see predict.predict.PredictionConfig)
+        :param predictor: the class name of the predictor to score with (see
+            predict.ALL_PREDICTORS)
+        """
+        with open(predictors_path, 'rb') as file:
+            saved = pickle.load(file)
+        if predictor not in saved['predictors']:
+            raise ValueError(f"No saved '{predictor}' predictors. Saved: "
+                             f"{list(saved['predictors'])}")
+        self.features = saved['features']
+        self.dims = saved['dims']
+        self.labels = saved['labels']
+        self.predictors = saved['predictors'][predictor]
+
+    @property
+    def num_k(self):
+        return len(self.predictors)
+
+    def horizons(self, lengths):
+        """
+        Returns the horizon k at which words with time series of the given
+        lengths are scored, -1 for words without any time slice yet.
+        """
+        return np.minimum(lengths, self.num_k) - 1
+
+    def score(self, all_time_series):
+        """
+        Scores a batch of words at once.
+
+        :param all_time_series: for each word, its time series so far as a
+            {dim: [value of each time slice]} dict, with every dim of
+            'self.dims', or as a (n_dims, n_slices) array
+        :return: (n_words, n_labels) probabilities of each label of
+            'self.labels', NaN for words without any time slice yet
+        """
+        values, lengths = self._pad(all_time_series)
+        ks = self.horizons(lengths)
+        if self.features == 'summary':
+            values = summarize(values, lengths)
+        probs = np.full((len(ks), len(self.labels)), np.nan)
+        for k in np.unique(ks[ks >= 0]):
+            words = np.flatnonzero(ks == k)
+            if self.features == 'summary':
+                X = values[words, k]
+            else:
+                X = values[words, :, :k + 1].reshape(len(words), -1)
+            predictor = self.predictors[k]
+            # The predictor may not have seen every label while fitting.
+            word_probs = np.zeros((len(words), len(self.labels)))
+            word_probs[:, predictor.classes] = predictor.predict_proba(X)
+            probs[words] = word_probs
+        return probs
+
+    def _pad(self, all_time_series):
+        """
+        :return: the NaN-padded (n_words, n_dims, num_k) values, cut to the
+            horizons the predictors cover, and the (n_words) lengths
+        """
+        values = np.full((len(all_time_series), len(self.dims), self.num_k),
+                         np.nan)
+        lengths = np.zeros(len(all_time_series), dtype=np.int64)
+        for i, time_series in enumerate(all_time_series):
+            if isinstance(time_series, dict):
+                missing = set(self.dims) - set(time_series)
+                if missing:
+                    raise ValueError(f"Missing time series: {missing}")
+                time_series = [time_series[dim] for dim in self.dims]
+            lengths[i] = min(len(ts) for ts in time_series)
+            for d, ts in enumerate(time_series):
+                ts = ts[:self.num_k]
+                values[i, d, :len(ts)] = ts
+        return values, lengths
+
+
+class ServePredictionConfig(CommandConfigBase):
+    def __init__(self, **kwargs):
+        """
+        Configs for the ServePrediction class. Accepted kwargs are:
+
+        experiment_dir: (type: Path-like, default: utils.pathing.EXPERIMENT_DIR)
+            Directory (either relative to utils.pathing.EXPERIMENTS_ROOT_DIR or
+            absolute) representing the currently-running experiment.
+
+        input_dir: (type: Path-like, default: utils.pathing.PREDICTOR_DIR)
+            Directory (either absolute or relative to 'experiment_dir') from
+            which to read the saved predictors.
+
+        predictors_file: (type: str, default:
+                utils.pathing.PREDICTORS_EXISTING_FILE)
+            Path (relative to 'input_dir') of the predictors saved by the
+            'predict' stage.
+
+        predictor: (type: str, default: 'RandomForest')
+            The class name of the predictor to score with. See
+            predict.ALL_PREDICTORS.
+
+        :param kwargs: optional configs to overwrite defaults (see above)
+        """
+        self.experiment_dir = kwargs.pop('experiment_dir', EXPERIMENT_DIR)
+        self.input_dir = kwargs.pop('input_dir', PREDICTOR_DIR)
+        self.predictors_file = kwargs.pop('predictors_file',
+                                          PREDICTORS_EXISTING_FILE)
+        self.predictor = kwargs.pop('predictor', 'RandomForest')
+        super().__init__(**kwargs)
+
+    def make_paths_absolute(self):
+        paths = ExperimentPaths(
+            experiment_dir=self.experiment_dir,
+            predictor_dir=self.input_dir
+        )
+        self.experiment_dir = paths.experiment_dir
+        self.input_dir = paths.predictor_dir
+        self.predictors_file = makepath(self.input_dir, self.predictors_file)
+        return self
+
+
+class ServePrediction:
+    def __init__(self, config: ServePredictionConfig):
+        """
+        Scores new words read from stdin, writing the results to stdout, one
+        batch per line, until stdin is closed. Each input line is a JSON list
+        of words (or a single word) such as:
+
+        [{"word": "yeet", "user": [0.1, 0.4], "subreddit": [0.2, 0.2]}, ...]
+
+        with a time series for every saved dimension. Each output line is the
+        JSON list of the corresponding scores, such as:
+
+        [{"word": "yeet", "k": 1, "probabilities": {"surviving": 0.7, ...}}]
+
+        where 'k' is the horizon scored at (null, with null probabilities,
+        for words without any time slice yet). Lines that can't be scored
+        are answered with {"error": message} instead.
+
+        :param config: see ServePredictionConfig for details
+        """
+        self.config = config
+        self.scorer = Scorer(config.predictors_file, config.predictor)
+
+    def run(self, input_file=sys.stdin, output_file=sys.stdout) -> None:
+        for line in input_file:
+            if not line.strip():
+                continue
+            try:
+                response = self._respond(json.loads(line))
+            except (ValueError, TypeError, KeyError) as e:
+                response = {'error': str(e)}
+            output_file.write(json.dumps(response) + "\n")
+            output_file.flush()
+
+    def _respond(self, words):
+        if isinstance(words, dict):
+            words = [words]
+        probs = self.scorer.score(words)
+        ks = self.scorer.horizons([min(len(word[dim])
+                                       for dim in self.scorer.dims)
+                                   for word in words])
+        response = []
+        for word, k, word_probs in zip(words, ks, probs):
+            scored = k >= 0
+            response.append({
+                'word': word.get('word'),
+                'k': int(k) if scored else None,
+                'probabilities': {
+                    label: float(p) if scored else None
+                    for label, p in zip(self.scorer.labels, word_probs)
+                }
+            })
+        return response
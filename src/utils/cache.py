@@ -0,0 +1,146 @@
+import hashlib
+import logging
+import pickle
+import time
+import os
+
+from utils.pathing import makepath, ensure_path
+
+# Part of every cache key. Bump it whenever the code computing any cached
+# result changes, so that stale results aren't reused.
+CACHE_VERSION = 2
+
+
+class ResultCache:
+    def __init__(self, cache_dir, max_size=None, max_age=None):
+        """
+        On-disk cache of intermediate results, keyed on the content hash of
+        their inputs plus the configs that affect their computation. Entries
+        are evicted when older than 'max_age' or, least recently used first,
+        when the cache grows larger than 'max_size'.
+
+        Use pattern:
+
+        cache = ResultCache('my_cache_dir', max_size=2 ** 30)
+        key = cache.key(cache.hash_files('my_store'), 'my_stage', drop_last)
+        result = cache.get(key)
+        if result is None:
+            result = expensive_computation()
+            cache.put(key, result)
+
+        :param cache_dir: the directory in which to store the entries
+        :param max_size: if given, the maximum total size of the entries, in
+            bytes
+        :param max_age: if given, the maximum time since an entry was last
+            used, in seconds
+        """
+        self.cache_dir = ensure_path(cache_dir)
+        self.max_size = max_size
+        self.max_age = max_age
+
+    @staticmethod
+    def hash_files(*paths):
+        """
+        Returns the hex digest of the contents of all files at 'paths'. For
+        directories, all files within are hashed, in sorted order.
+        """
+        digest = hashlib.sha256()
+        for path in paths:
+            files = [path]
+            if os.path.isdir(path):
+                files = sorted(makepath(root, file)
+                               for root, _, names in os.walk(path)
+                               for file in names)
+            for file in files:
+                digest.update(os.path.relpath(file, path).encode())
+                with open(file, 'rb') as f:
+                    for chunk in iter(lambda: f.read(2 ** 20), b''):
+                        digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def key(*parts):
+        """
+        Returns the cache key of the given parts (e.g., input hashes and
+        configs), which must have a deterministic repr(), salted with
+        CACHE_VERSION.
+        """
+        parts = (CACHE_VERSION,) + parts
+        return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+    def get(self, key):
+        """
+        Returns the cached result for 'key', or None if there is none. Entries
+        that can't be loaded (e.g., truncated, or pickled by incompatible code)
+        are removed and treated as missing.
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as file:
+                result = pickle.load(file)
+        except FileNotFoundError:
+            return None
+        except (EOFError, pickle.UnpicklingError, AttributeError, ImportError,
+                ValueError) as e:
+            logging.warning(f"Removing unreadable cache entry {path}: {e!r}")
+            try:
+                os.remove(path)
+            except FileNotFoundError:  # Evicted concurrently.
+                pass
+            return None
+        try:
+            os.utime(path)  # Marks it as recently used.
+        except FileNotFoundError:  # Evicted concurrently, but already read.
+            pass
+        return result
+
+    def get_or_compute(self, key, compute):
+        """
+        Returns the cached result for 'key', computing and caching it with
+        'compute()' first if there is none.
+        """
+        result = self.get(key)
+        if result is None:
+            result = compute()
+            self.put(key, result)
+        return result
+
+    def put(self, key, result):
+        """
+        Caches 'result' under 'key', then evicts entries if needed.
+        """
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as file:
+            pickle.dump(result, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)  # Atomic, so readers never see partials.
+        self.evict()
+
+    def evict(self):
+        """
+        Removes the entries that are too old, then the least recently used ones
+        until the cache is within its maximum size.
+        """
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".pickle"):
+                try:
+                    stat = os.stat(makepath(self.cache_dir, name))
+                except FileNotFoundError:  # Evicted concurrently.
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+        entries.sort()
+        now, total = time.time(), sum(size for _, size, _ in entries)
+        for mtime, size, name in entries:
+            too_old = self.max_age is not None and now - mtime > self.max_age
+            too_big = self.max_size is not None and total > self.max_size
+            if not too_old and not too_big:
+                continue
+            try:
+                os.remove(makepath(self.cache_dir, name))
+            except FileNotFoundError:  # Evicted concurrently.
+                pass
+            total -= size
+
+    def _path(self, key):
+        return makepath(self.cache_dir, f"{key}.pickle")
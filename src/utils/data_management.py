@@ -1,4 +1,5 @@
 from collections import defaultdict
+import numpy as np
 import pickle
 import os
 
@@ -78,3 +79,49 @@ def make_file_row_map(usage_dict_file, id_map_file):
             file, row = mapper.reverse(comment_id)
             file_row_map[file][row].append(word)
     return file_row_map
+
+
+def usage_index_path(neo_path):
+    """
+    Returns the path of the usage index saved next to a neologism file.
+    """
+    return os.path.splitext(neo_path)[0] + ".index.npz"
+
+
+def make_usage_index(usage_dict):
+    """
+    Builds a compact, columnar index of a usage dictionary: each word's first
+    and last usage and usage count, without the (much larger) usage ID lists.
+
+    :return: {'words', 'first', 'last', 'count'}, as aligned arrays
+    """
+    return {
+        'words': np.array(list(usage_dict), dtype=str),
+        'first': np.array([usage[0] for usage in usage_dict.values()]),
+        'last': np.array([usage[1] for usage in usage_dict.values()]),
+        'count': np.array([len(usage[2]) for usage in usage_dict.values()],
+                          dtype=np.int64)
+    }
+
+
+def save_usage_index(usage_dict, neo_path):
+    """
+    Saves the usage index of the usage dictionary of a neologism file next to
+    it. See make_usage_index().
+    """
+    np.savez(usage_index_path(neo_path), **make_usage_index(usage_dict))
+
+
+def load_usage_index(neo_path):
+    """
+    Loads the usage index saved by save_usage_index(). If there is none (e.g.,
+    for older experiments), it is built from the neologism file itself.
+
+    :return: {'words', 'first', 'last', 'count'}, as aligned arrays
+    """
+    index_path = usage_index_path(neo_path)
+    if os.path.exists(index_path):
+        with np.load(index_path) as index:
+            return {key: index[key] for key in index.files}
+    with open(neo_path, 'rb') as file:
+        return make_usage_index(pickle.load(file))
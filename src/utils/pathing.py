@@ -41,6 +41,8 @@ RESULTS_DIR = "results"
 # Data-specific paths.
 EXIST_DATA_DIR = makepath(DATA_DIR, "existing")
 CACHE_DIR = makepath(DATA_DIR, "cache")
+ANALYSIS_CACHE_DIR = makepath(CACHE_DIR, "analysis")
+PREDICT_CACHE_DIR = makepath(CACHE_DIR, "predict")
 RAW_DATA_DIR = makepath(DATA_DIR, "raw")
 PREPROC_DATA_DIR = makepath(DATA_DIR, "preprocessed")
 CAP_DATA_DIR = makepath(DATA_DIR, "cap_freq")
@@ -50,7 +52,9 @@ NEO_DATA_DIR = makepath(DATA_DIR, "neologisms")
 
 # Model-specific paths.
 DIST_DIR = makepath(MODEL_DIR, "distributions")
+BASE_DIST_DIR = makepath(MODEL_DIR, "daily_base")
 TIME_SERIES_DIR = makepath(MODEL_DIR, "time_series")
+PREDICTOR_DIR = makepath(MODEL_DIR, "predictors")
 
 # Results-specific paths.
 PLOT_TS_DIR = makepath(RESULTS_DIR, "plot_ts")
@@ -64,6 +68,11 @@ ID_MAP_FILE = "id_map.pickle"
 SURVIVING_FILE = "surviving.pickle"
 DYING_FILE = "dying.pickle"
 EXISTING_FILE = "existing.pickle"
+SURVIVING_STORE = "surviving"
+DYING_STORE = "dying"
+EXISTING_STORE = "existing"
+PREDICTORS_FILE = "predictors.pickle"
+PREDICTORS_EXISTING_FILE = "predictors-existing.pickle"
 
 
 class ExperimentPaths:
@@ -75,6 +84,8 @@ class ExperimentPaths:
             results_dir=RESULTS_DIR,
             exist_data_dir=EXIST_DATA_DIR,
             cache_dir=CACHE_DIR,
+            analysis_cache_dir=ANALYSIS_CACHE_DIR,
+            predict_cache_dir=PREDICT_CACHE_DIR,
             raw_data_dir=RAW_DATA_DIR,
             preproc_data_dir=PREPROC_DATA_DIR,
             cap_data_dir=CAP_DATA_DIR,
@@ -82,7 +93,9 @@ class ExperimentPaths:
             usages_data_dir=USAGES_DATA_DIR,
             neo_data_dir=NEO_DATA_DIR,
             dist_dir=DIST_DIR,
+            base_dist_dir=BASE_DIST_DIR,
             time_series_dir=TIME_SERIES_DIR,
+            predictor_dir=PREDICTOR_DIR,
             plot_ts_dir=PLOT_TS_DIR,
             stats_dir=STATS_DIR,
             predict_dir=PREDICT_DIR
@@ -103,6 +116,8 @@ class ExperimentPaths:
         self.results_dir = self._process(results_dir)
         self.exist_data_dir = self._process(exist_data_dir)
         self.cache_dir = self._process(cache_dir)
+        self.analysis_cache_dir = self._process(analysis_cache_dir)
+        self.predict_cache_dir = self._process(predict_cache_dir)
         self.raw_data_dir = self._process(raw_data_dir)
         self.preproc_data_dir = self._process(preproc_data_dir)
         self.cap_data_dir = self._process(cap_data_dir)
@@ -110,7 +125,9 @@ class ExperimentPaths:
         self.usages_data_dir = self._process(usages_data_dir)
         self.neo_data_dir = self._process(neo_data_dir)
         self.dist_dir = self._process(dist_dir)
+        self.base_dist_dir = self._process(base_dist_dir)
         self.time_series_dir = self._process(time_series_dir)
+        self.predictor_dir = self._process(predictor_dir)
         self.plot_ts_dir = self._process(plot_ts_dir)
         self.stats_dir = self._process(stats_dir)
         self.predict_dir = self._process(predict_dir)
@@ -0,0 +1,117 @@
+import numpy as np
+
+
+def pad(ragged):
+    """
+    Pads variable-length series into one NaN-padded 2D array.
+
+    :param ragged: a sequence of sequences of numbers
+    :return: the NaN-padded array, (n_series, max length)
+    """
+    lengths = [len(series) for series in ragged]
+    padded = np.full((len(ragged), max(lengths, default=0)), np.nan)
+    for i, series in enumerate(ragged):
+        padded[i, :len(series)] = series
+    return padded
+
+
+def ragged_stats(ragged, quantiles=None, n_boot=0, confidence=0.95, seed=0):
+    """
+    Computes statistics pooled across series at each index, ignoring series
+    too short to reach that index, in one vectorized call.
+
+    Use pattern:
+
+    stats = ragged_stats([[0.1, 0.5], [0.2], [0.3, 0.4, 0.9]])
+    stats['mean']  # array([0.2, 0.45, 0.9])
+    stats['count']  # array([3, 2, 1])
+
+    :param ragged: a sequence of sequences of numbers, or an already
+        NaN-padded 2D array (n_series, n_indices)
+    :param quantiles: if given, the quantiles (in [0, 1]) to compute
+    :param n_boot: if positive, the number of bootstrap resamples (of whole
+        series) from which to compute a confidence interval of the mean
+    :param confidence: the level of the bootstrap confidence interval
+    :param seed: the seed of the bootstrap resampling
+    :return: {'mean', 'std', 'count'} and, if requested, 'quantiles'
+        (n_quantiles, n_indices), 'ci_low' and 'ci_high', as arrays over the
+        indices up to the longest series
+    """
+    if isinstance(ragged, np.ndarray) and ragged.ndim == 2:
+        values = np.asarray(ragged, dtype=float)
+    else:
+        values = pad(ragged)
+    count = np.sum(~np.isnan(values), axis=0)
+    values = values[:, :len(np.trim_zeros(count, 'b'))]  # No empty indices.
+    count = count[:values.shape[1]]
+    stats = {
+        'mean': np.nanmean(values, axis=0),
+        'std': np.nanstd(values, axis=0),
+        'count': count
+    }
+    if quantiles is not None:
+        stats['quantiles'] = np.nanquantile(values, quantiles, axis=0)
+    if n_boot > 0 and len(values):
+        rng = np.random.default_rng(seed)
+        rows = rng.integers(0, len(values), size=(n_boot, len(values)))
+        # Resamples can miss every series reaching an index.
+        with np.errstate(invalid='ignore', divide='ignore'):
+            sums = np.nansum(values[rows], axis=1)
+            counts = np.sum(~np.isnan(values[rows]), axis=1)
+            means = sums / counts
+        alpha = (1 - confidence) / 2
+        low, high = np.nanquantile(means, [alpha, 1 - alpha], axis=0)
+        stats['ci_low'], stats['ci_high'] = low, high
+    return stats
+
+
+def expanding_spearman(values, lengths):
+    """
+    Computes Spearman's rho between the time index and every prefix (of at
+    least two time slices) of every time series at once.
+
+    The ranks of each prefix are derived from cumulative sums over a pairwise
+    comparison tensor, so that extending a prefix by one time slice is a
+    single incremental update of every rank. Tied values get their average
+    rank, as in scipy.stats.spearmanr(). A rho is undefined (NaN in SciPy) if
+    its prefix is constant or contains a NaN. Those are set to 0.0 instead.
+
+    :param values: the NaN-padded time series, (n_series, n_slices)
+    :param lengths: the length of each time series, (n_series)
+    :return: the rhos, (n_series, n_slices - 1), where rhos[:, k - 1] is the
+        rho of the first k + 1 time slices (NaN if longer than the time
+        series), and the number of undefined rhos set to 0.0
+    """
+    values = np.asarray(values, dtype=float)
+    n_series, n_slices = values.shape
+    rhos = np.full((n_series, max(0, n_slices - 1)), np.nan)
+    if n_series == 0 or n_slices < 2:
+        return rhos, 0
+    m = np.arange(1, n_slices + 1)  # The length of each prefix.
+    t = np.arange(1, n_slices + 1)  # The ranks of the time index.
+    in_prefix = np.triu(np.ones((n_slices, n_slices)))  # [i, m - 1]: i < m.
+    mean_sq = m * ((m + 1) / 2) ** 2  # Both rank means are (m + 1) / 2.
+    var_t = m * (m ** 2 - 1) / 12
+    valid = m[None, 1:] <= np.asarray(lengths)[:, None]
+    n_undefined = 0
+    # The comparison tensor is (chunk, n_slices, n_slices), so chunk the
+    # series to bound memory.
+    chunk = max(1, 2 ** 22 // (n_slices * n_slices))
+    for start in range(0, n_series, chunk):
+        x = values[start:start + chunk]
+        # [c, i, j]: how x_j compares to x_i, accumulated over j < m.
+        less = np.cumsum(x[:, None, :] < x[:, :, None], axis=2)
+        equal = np.cumsum(x[:, None, :] == x[:, :, None], axis=2)
+        ranks = (less + (equal + 1) / 2) * in_prefix  # Average ranks.
+        cov = np.einsum('cim,i->cm', ranks, t) - mean_sq
+        var_r = np.einsum('cim,cim->cm', ranks, ranks) - mean_sq
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rho = np.clip(cov / np.sqrt(var_r * var_t), -1.0, 1.0)
+        constant = equal[:, 0, :] == m
+        has_nan = np.cumsum(np.isnan(x), axis=1) > 0
+        undefined = (constant | has_nan)[:, 1:]
+        chunk_valid = valid[start:start + chunk]
+        n_undefined += int(np.sum(undefined & chunk_valid))
+        rho = np.where(undefined, 0.0, rho[:, 1:])
+        rhos[start:start + chunk] = np.where(chunk_valid, rho, np.nan)
+    return rhos, n_undefined
@@ -1,4 +1,5 @@
-from datetime import timedelta, datetime
+from datetime import timedelta, datetime, timezone
+import numpy as np
 
 from utils.config import warn_not_empty
 
@@ -33,6 +34,11 @@ class TimelineConfig:
         slice_size: (type: str, default: 'week')
             The time interval defining the size of each time slice.
 
+        utc: (type: bool, default: False)
+            Whether to slice time in UTC. If False, slicing is done in the
+            host's local timezone, which makes the slice boundaries (and hence
+            the results) depend on the machine's timezone settings.
+
         :param kwargs: optional configs to overwrite defaults (see above)
         """
         self.start = kwargs.pop('start', 0)
@@ -40,6 +46,7 @@ class TimelineConfig:
         self.early = kwargs.pop('early', 1)
         self.late = kwargs.pop('late', 1)
         self.slice_size = kwargs.pop('slice_size', 'week')
+        self.utc = kwargs.pop('utc', False)
         warn_not_empty(kwargs)
 
         if self.start >= self.end or self.start < 0:
@@ -56,19 +63,30 @@ class Timeline:
         """
         Utilities for managing a time line and slices thereof.
 
+        Each scalar method has an array-accepting counterpart ('are_early',
+        'are_late', 'slices_of') that takes a NumPy array of POSIX timestamps
+        and is backed by precomputed integer slice boundaries.
+
         :param config: see TimelineConfig for details
         """
         self.config = config
+        self.tz = timezone.utc if self.config.utc else None
         self.slice_size = self.config.slice_size_options[self.config.slice_size]
         self.early_cutoff = int((
-            datetime.fromtimestamp(self.config.start)
+            datetime.fromtimestamp(self.config.start, tz=self.tz)
             + self.config.early * self.slice_size
         ).timestamp())
         self.late_cutoff = int((
-            datetime.fromtimestamp(self.config.end)
+            datetime.fromtimestamp(self.config.end, tz=self.tz)
             - self.config.late * self.slice_size
         ).timestamp())
-        self.start_datetime = datetime.fromtimestamp(self.config.start)
+        self.start_datetime = datetime.fromtimestamp(
+            self.config.start, tz=self.tz)
+        # POSIX start time of every slice, plus the end of the last slice.
+        self.boundaries = np.array([
+            int((self.start_datetime + i * self.slice_size).timestamp())
+            for i in range(self.slice_of(self.config.end) + 2)
+        ], dtype=np.int64)
 
     def is_early(self, timestamp):
         return self.config.start <= timestamp <= self.early_cutoff
@@ -79,5 +97,22 @@ class Timeline:
     def slice_of(self, timestamp):
         if timestamp < self.config.start or timestamp > self.config.end:
             raise ValueError("timestamp out of range")
-        td = datetime.fromtimestamp(timestamp) - self.start_datetime
+        td = datetime.fromtimestamp(timestamp, tz=self.tz) - self.start_datetime
         return int(td / self.slice_size)
+
+    def are_early(self, timestamps):
+        timestamps = np.asarray(timestamps)
+        return (self.config.start <= timestamps) & \
+               (timestamps <= self.early_cutoff)
+
+    def are_late(self, timestamps):
+        timestamps = np.asarray(timestamps)
+        return (self.late_cutoff <= timestamps) & \
+               (timestamps <= self.config.end)
+
+    def slices_of(self, timestamps):
+        timestamps = np.asarray(timestamps)
+        if np.any((timestamps < self.config.start) |
+                  (timestamps > self.config.end)):
+            raise ValueError("timestamp out of range")
+        return np.searchsorted(self.boundaries, timestamps, side='right') - 1
@@ -0,0 +1,120 @@
+import numpy as np
+import pickle
+import os
+
+from utils.pathing import makepath, ensure_path
+
+
+class TimeSeriesStore:
+    WORDS_FILE = "words.npy"
+    DIMS_FILE = "dims.npy"
+    VALUES_FILE = "values.npy"
+    LENGTHS_FILE = "lengths.npy"
+
+    def __init__(self, words, dims, values, lengths):
+        """
+        Columnar store of the entropy time series of one category of words.
+
+        Use pattern:
+
+        # Writing (e.g., in the 'time-series' stage).
+        TimeSeriesStore.from_dict(time_series_by_word).save('my_store')
+
+        # Reading (e.g., in an analysis stage). Near-instant: the values are
+        # memory-mapped rather than read.
+        store = TimeSeriesStore.load('my_store')
+        user = store.dim('user')  # (n_words, n_slices), NaN-padded.
+        for word, length, ts in zip(store.words, store.lengths, user):
+            ts = ts[:length]
+            # Business logic involving ts
+            ...
+
+        :param words: the word vocabulary, (n_words)
+        :param dims: the time series dimensions (e.g., 'user', 'subreddit')
+        :param values: NaN-padded time series, (n_words, n_slices, n_dims)
+        :param lengths: the length of each word's time series, (n_words)
+        """
+        self.words = words
+        self.dims = list(dims)
+        self.values = values
+        self.lengths = lengths
+
+    def __len__(self):
+        return len(self.words)
+
+    def dim(self, name):
+        """
+        Returns the NaN-padded (n_words, n_slices) matrix of one dimension.
+        """
+        return self.values[:, :, self.dims.index(name)]
+
+    def truncate(self, n_slices):
+        """
+        Returns a store whose time series are cut to at most 'n_slices' long.
+        The values are a view of this store's values, not a copy.
+        """
+        return TimeSeriesStore(self.words, self.dims,
+                               self.values[:, :n_slices],
+                               np.minimum(self.lengths, n_slices))
+
+    def to_dict(self):
+        """
+        Returns the time series as {word: {dim: [value of each time slice]}}.
+        """
+        return {str(word): {dim: self.values[i, :length, d].tolist()
+                            for d, dim in enumerate(self.dims)}
+                for i, (word, length) in enumerate(zip(self.words,
+                                                       self.lengths))}
+
+    @staticmethod
+    def from_dict(time_series):
+        """
+        Builds a store from {word: {dim: [value of each time slice]}}.
+        """
+        dims = {}  # Ordered set.
+        for all_time_series in time_series.values():
+            dims.update(dict.fromkeys(all_time_series))
+        dims = list(dims)
+        lengths = np.array([max(len(ts) for ts in all_time_series.values())
+                            for all_time_series in time_series.values()],
+                           dtype=np.int64)
+        n_slices = int(lengths.max()) if len(lengths) else 0
+        values = np.full((len(time_series), n_slices, len(dims)), np.nan,
+                         dtype=np.float32)
+        for i, all_time_series in enumerate(time_series.values()):
+            for d, dim in enumerate(dims):
+                ts = all_time_series.get(dim, [])
+                values[i, :len(ts), d] = ts
+        words = np.array(list(time_series), dtype=str)
+        return TimeSeriesStore(words, dims, values, lengths)
+
+    def save(self, path):
+        """
+        Saves this store as a directory of '.npy' files.
+        """
+        ensure_path(path)
+        np.save(makepath(path, self.WORDS_FILE), self.words)
+        np.save(makepath(path, self.DIMS_FILE), np.array(self.dims, dtype=str))
+        np.save(makepath(path, self.VALUES_FILE), self.values)
+        np.save(makepath(path, self.LENGTHS_FILE), self.lengths)
+
+    @staticmethod
+    def load(path, mmap=True):
+        """
+        Loads a store saved with 'save()'. For backwards compatibility, 'path'
+        can also be a pickled {word: {dim: [value of each time slice]}} file.
+
+        :param path: the store directory (or legacy pickle file)
+        :param mmap: whether to memory-map the values instead of reading them
+        :return: the loaded store
+        """
+        if not os.path.isdir(path):
+            with open(path, 'rb') as file:
+                return TimeSeriesStore.from_dict(pickle.load(file))
+        return TimeSeriesStore(
+            words=np.load(makepath(path, TimeSeriesStore.WORDS_FILE)),
+            dims=np.load(makepath(path, TimeSeriesStore.DIMS_FILE)).tolist(),
+            values=np.load(makepath(path, TimeSeriesStore.VALUES_FILE),
+                           mmap_mode='r' if mmap else None),
+            lengths=np.load(makepath(path, TimeSeriesStore.LENGTHS_FILE))
+        )
@@ -0,0 +1,33 @@
+import subprocess
+import json
+import time
+import sys
+import os
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'src')
+
+# Only the command that is run may import these (see commands.ALL_COMMANDS).
+HEAVY_MODULES = ['sklearn', 'scipy', 'matplotlib', 'spacy', 'nltk', 'pmaw']
+
+# Generous, as 'main.py -h' takes about 0.1 s when nothing heavy is imported.
+STARTUP_BUDGET = 2.0  # Seconds.
+
+
+def test_no_heavy_imports():
+    # A fresh interpreter, as pytest itself may have imported some already.
+    code = ("import sys, json; import main, commands; print(json.dumps("
+            f"[m for m in {HEAVY_MODULES!r} if m in sys.modules]))")
+    result = subprocess.run([sys.executable, '-c', code], cwd=SRC_DIR,
+                            capture_output=True, text=True, check=True)
+    assert json.loads(result.stdout) == []
+
+
+def test_help_within_budget():
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, 'main.py', '-h'], cwd=SRC_DIR,
+                            capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    assert result.returncode == 0, result.stderr
+    assert 'serve-predict' in result.stdout
+    assert elapsed < STARTUP_BUDGET